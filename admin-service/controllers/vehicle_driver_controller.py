@@ -8,12 +8,35 @@ from utils.token import verification
 from sqlalchemy import select, func
 from models.models import Vehicle, Driver
 from models.schema import AddDriver
+from utils.fleet_events import (
+    publish_vehicle_update,
+    publish_driver_update,
+    rebuild_location_index,
+)
+from utils.streaming import ndjson_response
 import uuid
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Only the fields of VehicleResponse / DriverResponse, read as plain rows
+VEHICLE_LIST_COLUMNS = (
+    Vehicle.vehicleid,
+    Vehicle.model_name,
+    Vehicle.registration_number,
+    Vehicle.is_available,
+    Vehicle.fuel_type,
+)
+
+DRIVER_LIST_COLUMNS = (
+    Driver.driverid,
+    Driver.name,
+    Driver.email,
+    Driver.mobile,
+    Driver.availability,
+)
+
 
 class VehicleDriverController:
     def __init__(self, db: AsyncSession):
@@ -50,6 +73,7 @@ class VehicleDriverController:
             self.db.add(new_vehicle)
             await self.db.commit()
             await self.db.refresh(new_vehicle)
+            await publish_vehicle_update(new_vehicle)
 
             return new_vehicle
         except Exception:
@@ -92,9 +116,14 @@ class VehicleDriverController:
             total_count_result = await self.db.execute(total_count_query)
             total_count = total_count_result.scalar()
 
-            vehicles_query = select(Vehicle).limit(limit).offset(offset)
+            vehicles_query = (
+                select(*VEHICLE_LIST_COLUMNS)
+                .order_by(Vehicle.id)
+                .limit(limit)
+                .offset(offset)
+            )
             vehicles_result = await self.db.execute(vehicles_query)
-            vehicles = vehicles_result.scalars().all()
+            vehicles = [dict(row._mapping) for row in vehicles_result]
 
             total_pages = (total_count + limit - 1) // limit
 
@@ -113,6 +142,14 @@ class VehicleDriverController:
                 detail="Server Error: Unable to fetch vehicles.",
             )
 
+    def stream_all_vehicles(self, token: str, offset: int = 0):
+        verification(token=token, role="admin", entity_id=self.admin_email)
+
+        vehicles_query = (
+            select(*VEHICLE_LIST_COLUMNS).order_by(Vehicle.id).offset(offset)
+        )
+        return ndjson_response(vehicles_query, lambda row: dict(row._mapping))
+
     async def add_driver(self, driver_data: AddDriver, token: str):
         try:
             verification(token=token, role="admin", entity_id=self.admin_email)
@@ -144,6 +181,7 @@ class VehicleDriverController:
             self.db.add(new_driver)
             await self.db.commit()
             await self.db.refresh(new_driver)
+            await publish_driver_update(new_driver)
 
             return new_driver
         except Exception as e:
@@ -160,9 +198,14 @@ class VehicleDriverController:
             total_count_result = await self.db.execute(total_count_query)
             total_count = total_count_result.scalar()
 
-            drivers_query = select(Driver).limit(limit).offset(offset)
+            drivers_query = (
+                select(*DRIVER_LIST_COLUMNS)
+                .order_by(Driver.id)
+                .limit(limit)
+                .offset(offset)
+            )
             drivers_result = await self.db.execute(drivers_query)
-            drivers = drivers_result.scalars().all()
+            drivers = [dict(row._mapping) for row in drivers_result]
 
             total_pages = (total_count + limit - 1) // limit
 
@@ -179,3 +222,19 @@ class VehicleDriverController:
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Server Error: Unable to fetch drivers.",
             )
+
+    def stream_all_drivers(self, token: str, offset: int = 0):
+        verification(token=token, role="admin", entity_id=self.admin_email)
+
+        drivers_query = select(*DRIVER_LIST_COLUMNS).order_by(Driver.id).offset(offset)
+        return ndjson_response(drivers_query, lambda row: dict(row._mapping))
+
+    async def rebuild_location_index(self, token: str):
+        try:
+            verification(token=token, role="admin", entity_id=self.admin_email)
+            return await rebuild_location_index(self.db)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Server Error: Unable to rebuild location index.",
+            )
@@ -5,7 +5,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from routes.admin_route import admin_route
 from routes.vehicle_driver_route import vehicle_driver_route
 from datetime import datetime, timezone
-from config.cache import RedisCache
+from config.cache import RedisCache, VEHICLE_LOCATIONS_KEY
+from config.database import SessionLocal
+from utils.fleet_events import rebuild_location_index
 
 
 app = FastAPI()
@@ -16,6 +18,20 @@ app.include_router(vehicle_driver_route)
 cache = RedisCache()
 
 
+@app.on_event("startup")
+async def build_location_index():
+    """
+    Fill the shared geo index from the database the first time it is needed.
+    """
+    try:
+        if not await cache.cache.exists(VEHICLE_LOCATIONS_KEY):
+            async with SessionLocal() as session:
+                counts = await rebuild_location_index(session)
+            print(f"Built location index: {counts}")
+    except Exception as e:
+        print(f"Error building location index: {e}")
+
+
 @app.get("/head")
 async def head(db: AsyncSession = Depends(get_db)):
     """
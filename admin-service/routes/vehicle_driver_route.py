@@ -4,6 +4,8 @@ from config.database import get_db
 from models.schema import AddDriver, AddVehicle, VehiclesResponse, DriversResponse
 from controllers.vehicle_driver_controller import VehicleDriverController
 from utils.populate_data import add_vehicles_without_token
+from utils.fleet_events import publish_fleet_reload
+from utils.streaming import wants_ndjson
 
 vehicle_driver_route = APIRouter(prefix="/logistics", tags=["admin"])
 
@@ -54,12 +56,21 @@ async def get_all_vehicles(
     authorization: str = Header(...),
     limit: int = Query(10, description="Limit the number of vehicles returned"),
     offset: int = Query(0, description="The starting point of vehicle retrieval"),
+    stream: bool = Query(
+        False,
+        description="Stream every vehicle from offset as NDJSON, ignoring limit",
+    ),
+    accept: str = Header(None),
     db: AsyncSession = Depends(get_db),
 ):
     token = authorization.split(" ")[1]
     vehicle_driver_controller = VehicleDriverController(db)
 
     try:
+        if wants_ndjson(accept, stream):
+            return vehicle_driver_controller.stream_all_vehicles(
+                token=token, offset=offset
+            )
         return await vehicle_driver_controller.get_all_vehicles(
             token=token, limit=limit, offset=offset
         )
@@ -92,12 +103,21 @@ async def get_all_drivers(
     authorization: str = Header(...),
     limit: int = Query(10, description="Limit the number of drivers returned"),
     offset: int = Query(0, description="The starting point of driver retrieval"),
+    stream: bool = Query(
+        False,
+        description="Stream every driver from offset as NDJSON, ignoring limit",
+    ),
+    accept: str = Header(None),
     db: AsyncSession = Depends(get_db),
 ):
     token = authorization.split(" ")[1]
     vehicle_driver_controller = VehicleDriverController(db)
 
     try:
+        if wants_ndjson(accept, stream):
+            return vehicle_driver_controller.stream_all_drivers(
+                token=token, offset=offset
+            )
         return await vehicle_driver_controller.get_all_drivers(
             token=token, limit=limit, offset=offset
         )
@@ -125,7 +145,30 @@ async def get_all_drivers(
 #         )
 
 
+@vehicle_driver_route.post("/locations/rebuild")
+async def rebuild_location_index(
+    authorization: str = Header(...),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Reload the shared Redis geo index of vehicle and driver positions from
+    the database.
+    """
+    token = authorization.split(" ")[1]
+    vehicle_driver_controller = VehicleDriverController(db)
+
+    try:
+        return await vehicle_driver_controller.rebuild_location_index(token=token)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Server Error: Unable to rebuild location index.",
+        )
+
+
 @vehicle_driver_route.post("/populate-vehicles")
 async def populate_vehicles(num_vehicles: int = 10000, db=Depends(get_db)):
     await add_vehicles_without_token(db, num_vehicles)
+    # The generated vehicles are only written to Postgres
+    await publish_fleet_reload(db)
     return {"message": f"{num_vehicles} vehicles added successfully!"}
@@ -0,0 +1,129 @@
+from sqlalchemy import select
+from models.models import Vehicle, Driver
+from config.cache import (
+    RedisCache,
+    VEHICLE_UPDATES_CHANNEL,
+    DRIVER_UPDATES_CHANNEL,
+    VEHICLE_LOCATIONS_KEY,
+    DRIVER_LOCATIONS_KEY,
+    SEARCH_INVALIDATION_ALL_TAG,
+    search_invalidation_tag,
+)
+
+cache = RedisCache()
+
+
+async def record_location(key, member, latitude, longitude, available):
+    """
+    Keep the shared geo set limited to available members with a position.
+    """
+    if available and latitude is not None and longitude is not None:
+        await cache.geo_add(key, [(member, latitude, longitude)])
+    else:
+        await cache.geo_remove(key, [member])
+
+
+async def publish_vehicle_update(vehicle, previous_location=None):
+    """
+    Record the vehicle's position in the shared geo index, let user-service
+    workers refresh their in-memory vehicle index and drop the cached
+    searches around the vehicle's old and new position.
+    """
+    await record_location(
+        VEHICLE_LOCATIONS_KEY,
+        vehicle.vehicleid,
+        vehicle.current_latitude,
+        vehicle.current_longitude,
+        vehicle.is_available and vehicle.active_status,
+    )
+
+    locations = [(vehicle.current_latitude, vehicle.current_longitude)]
+    if previous_location is not None:
+        locations.append(previous_location)
+
+    tags = [SEARCH_INVALIDATION_ALL_TAG]
+    for latitude, longitude in locations:
+        if latitude is not None and longitude is not None:
+            tags.append(search_invalidation_tag(latitude, longitude))
+    await cache.invalidate_tags(tags)
+
+    await cache.publish(
+        VEHICLE_UPDATES_CHANNEL,
+        {
+            "vehicle_id": vehicle.vehicleid,
+            "current_latitude": vehicle.current_latitude,
+            "current_longitude": vehicle.current_longitude,
+            "capacity_in_kg": vehicle.capacity_in_kg,
+            "fuel_type": vehicle.fuel_type,
+            "is_available": vehicle.is_available,
+            "active_status": vehicle.active_status,
+        },
+    )
+
+
+async def publish_driver_update(driver):
+    """
+    Record the driver's position in the shared geo index and let
+    user-service workers refresh their nearest-driver index.
+    """
+    await record_location(
+        DRIVER_LOCATIONS_KEY,
+        driver.driverid,
+        driver.current_latitude,
+        driver.current_longitude,
+        driver.availability,
+    )
+
+    await cache.publish(
+        DRIVER_UPDATES_CHANNEL,
+        {
+            "driver_id": driver.driverid,
+            "current_latitude": driver.current_latitude,
+            "current_longitude": driver.current_longitude,
+            "availability": driver.availability,
+        },
+    )
+
+
+async def rebuild_location_index(db):
+    """
+    Reload both geo sets from Postgres, the durable record of positions.
+    """
+    vehicles = await db.execute(
+        select(
+            Vehicle.vehicleid, Vehicle.current_latitude, Vehicle.current_longitude
+        ).filter(
+            Vehicle.is_available == True,
+            Vehicle.active_status == True,
+            Vehicle.current_latitude.isnot(None),
+            Vehicle.current_longitude.isnot(None),
+        )
+    )
+    drivers = await db.execute(
+        select(
+            Driver.driverid, Driver.current_latitude, Driver.current_longitude
+        ).filter(
+            Driver.availability == True,
+            Driver.current_latitude.isnot(None),
+            Driver.current_longitude.isnot(None),
+        )
+    )
+
+    vehicle_locations = [tuple(row) for row in vehicles]
+    driver_locations = [tuple(row) for row in drivers]
+    await cache.geo_replace(VEHICLE_LOCATIONS_KEY, vehicle_locations)
+    await cache.geo_replace(DRIVER_LOCATIONS_KEY, driver_locations)
+
+    return {"vehicles": len(vehicle_locations), "drivers": len(driver_locations)}
+
+
+async def publish_fleet_reload(db):
+    """
+    After bulk writes that bypass publish_vehicle_update: reload the geo
+    sets, drop every cached search and let user-service workers refresh.
+    """
+    counts = await rebuild_location_index(db)
+    await cache.invalidate_tags([SEARCH_INVALIDATION_ALL_TAG])
+    await cache.publish(VEHICLE_UPDATES_CHANNEL, {"reloaded": True})
+    await cache.publish(DRIVER_UPDATES_CHANNEL, {"reloaded": True})
+    return counts
@@ -1,9 +1,32 @@
 import os
+import json
+import math
 from redis.asyncio import Redis
 from dotenv import load_dotenv
 
 load_dotenv()
 
+VEHICLE_UPDATES_CHANNEL = "vehicle-updates"
+DRIVER_UPDATES_CHANNEL = "driver-updates"
+BOOKING_UPDATES_CHANNEL = "booking-updates"
+
+# Live positions of available vehicles and drivers, shared by all services
+VEHICLE_LOCATIONS_KEY = "locations:vehicles"
+DRIVER_LOCATIONS_KEY = "locations:drivers"
+
+# Cached vehicle searches are tagged with the coarse cells their radius covers
+SEARCH_CACHE_PREFIX = "vehicle-search"
+SEARCH_INVALIDATION_CELL_DEG = 0.5
+SEARCH_INVALIDATION_ALL_TAG = f"{SEARCH_CACHE_PREFIX}:cell:all"
+
+GEOCODE_CACHE_PREFIX = "geocode"
+
+
+def search_invalidation_tag(latitude, longitude):
+    row = math.floor(float(latitude) / SEARCH_INVALIDATION_CELL_DEG)
+    col = math.floor(float(longitude) / SEARCH_INVALIDATION_CELL_DEG)
+    return f"{SEARCH_CACHE_PREFIX}:cell:{row}:{col}"
+
 
 class RedisCache:
     def __init__(self):
@@ -12,11 +35,11 @@ class RedisCache:
         self.cache = Redis(host=self.host, port=self.port, decode_responses=True)
         self.expiry = 60 * 10
 
-    async def set_cache(self, key, value):
+    async def set_cache(self, key, value, expiry=None):
         try:
             if isinstance(value, dict):
                 value = str(value)
-            await self.cache.set(key, value)
+            await self.cache.set(key, value, ex=expiry)
         except Exception as e:
             print(f"Error setting cache: {e}")
 
@@ -31,3 +54,163 @@ class RedisCache:
         except Exception as e:
             print(f"Error getting cache: {e}")
             return None
+
+    async def get_many(self, keys):
+        """
+        Values of many keys in one round trip, None where a key is missing.
+        """
+        try:
+            values = await self.cache.mget(keys) if keys else []
+            return [eval(value) if value else None for value in values]
+        except Exception as e:
+            print(f"Error getting cache: {e}")
+            return [None] * len(keys)
+
+    async def set_many(self, values: dict, expiry=None):
+        try:
+            async with self.cache.pipeline(transaction=False) as pipe:
+                for key, value in values.items():
+                    pipe.set(key, str(value), ex=expiry)
+                await pipe.execute()
+        except Exception as e:
+            print(f"Error setting cache: {e}")
+
+    async def delete(self, *keys):
+        try:
+            await self.cache.delete(*keys)
+        except Exception as e:
+            print(f"Error deleting cache: {e}")
+
+    async def set_if_absent(self, key, value, expiry):
+        """
+        SET NX: True only for the caller that created the key, False when it
+        already exists, None when Redis could not be reached.
+        """
+        try:
+            return bool(await self.cache.set(key, value, ex=expiry, nx=True))
+        except Exception as e:
+            print(f"Error setting cache: {e}")
+            return None
+
+    async def publish(self, channel, message):
+        try:
+            if isinstance(message, dict):
+                message = json.dumps(message)
+            await self.cache.publish(channel, message)
+        except Exception as e:
+            print(f"Error publishing to {channel}: {e}")
+
+    async def subscribe(self, channel):
+        pubsub = self.cache.pubsub()
+        await pubsub.subscribe(channel)
+        return pubsub
+
+    async def increment(self, key):
+        try:
+            await self.cache.incr(key)
+        except Exception as e:
+            print(f"Error incrementing {key}: {e}")
+
+    async def tag(self, key, tags, expiry):
+        try:
+            async with self.cache.pipeline(transaction=False) as pipe:
+                for tag in tags:
+                    pipe.sadd(tag, key)
+                    pipe.expire(tag, expiry)
+                await pipe.execute()
+        except Exception as e:
+            print(f"Error tagging cache: {e}")
+
+    async def invalidate_tags(self, tags):
+        try:
+            tags = list(set(tags))
+            if not tags:
+                return
+
+            async with self.cache.pipeline(transaction=False) as pipe:
+                for tag in tags:
+                    pipe.smembers(tag)
+                tagged_keys = await pipe.execute()
+
+            keys = set().union(*tagged_keys)
+            await self.cache.delete(*tags, *keys)
+        except Exception as e:
+            print(f"Error invalidating cache: {e}")
+
+    async def geo_add(self, key, locations):
+        """
+        locations: (member, latitude, longitude) tuples.
+        """
+        try:
+            values = []
+            for member, latitude, longitude in locations:
+                values += [longitude, latitude, member]
+            if values:
+                await self.cache.geoadd(key, values)
+        except Exception as e:
+            print(f"Error adding locations to {key}: {e}")
+
+    async def geo_remove(self, key, members):
+        try:
+            if members:
+                await self.cache.zrem(key, *members)
+        except Exception as e:
+            print(f"Error removing locations from {key}: {e}")
+
+    async def geo_replace(self, key, locations, chunk_size=5000):
+        """
+        Rebuild a geo set under a temporary key and swap it in, so readers
+        never see it half-built.
+        """
+        try:
+            building_key = f"{key}:building"
+            await self.cache.delete(building_key)
+            for start in range(0, len(locations), chunk_size):
+                values = []
+                for member, latitude, longitude in locations[
+                    start : start + chunk_size
+                ]:
+                    values += [longitude, latitude, member]
+                await self.cache.geoadd(building_key, values)
+
+            if locations:
+                await self.cache.rename(building_key, key)
+            else:
+                await self.cache.delete(key)
+        except Exception as e:
+            print(f"Error rebuilding {key}: {e}")
+
+    async def geo_search(self, key, searches, radius_km):
+        """
+        GEOSEARCH for many (latitude, longitude, count) searches in one round
+        trip. Each result lists (member, latitude, longitude), nearest first.
+        Returns None when Redis is unavailable or the set was never built.
+        """
+        try:
+            async with self.cache.pipeline(transaction=False) as pipe:
+                pipe.exists(key)
+                for latitude, longitude, count in searches:
+                    pipe.geosearch(
+                        key,
+                        longitude=longitude,
+                        latitude=latitude,
+                        radius=radius_km,
+                        unit="km",
+                        sort="ASC",
+                        count=count,
+                        withcoord=True,
+                    )
+                exists, *results = await pipe.execute()
+
+            if not exists:
+                return None
+            return [
+                [
+                    (member, latitude, longitude)
+                    for member, (longitude, latitude) in found
+                ]
+                for found in results
+            ]
+        except Exception as e:
+            print(f"Error searching {key}: {e}")
+            return None
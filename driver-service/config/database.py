@@ -20,10 +20,18 @@ SessionLocal = sessionmaker(
 
 Base = declarative_base()
 
+# create_all costs a catalog query per table, so it runs once per process.
+# It only creates missing tables; existing ones are changed by
+# "python -m config.migrations", run once before deploying.
+tables_created = False
+
 
 async def get_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    global tables_created
+    if not tables_created:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        tables_created = True
 
     async with SessionLocal() as session:
         yield session
@@ -5,8 +5,114 @@ from uuid import uuid4
 from utils.hashing import get_password_hash, verify_password
 from utils.token import create_access_token, verification
 from models.models import Driver, BookingRequest, Vehicle
+from utils.fleet_events import publish_vehicle_update, publish_driver_update
 from pydantic import EmailStr
 from typing import Literal
+from utils.pagination import (
+    newest_bookings_first,
+    booking_page_query,
+    booking_page,
+)
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BOOKING_PAGE_SIZE = int(os.getenv("BOOKING_PAGE_SIZE", 50))
+BOOKING_MAX_PAGE_SIZE = int(os.getenv("BOOKING_MAX_PAGE_SIZE", 200))
+
+# Async bookings still being priced, or whose pricing failed, have no price
+# for the driver to act on
+UNPRICED_REQUEST_STATUSES = ("Pricing", "Failed")
+
+
+# Columns returned for each booking filter, in response order; filters
+# other than "All" also select the bookings in that request status, and
+# "All" every priced booking
+DRIVER_BOOKING_PROJECTIONS = {
+    "Pending": (
+        BookingRequest.pickup_location,
+        BookingRequest.drop_location,
+        BookingRequest.distance_to_cover,
+        BookingRequest.request_status,
+        BookingRequest.booking_id,
+    ),
+    "Accepted": (
+        BookingRequest.pickup_location,
+        BookingRequest.pickup_latitude,
+        BookingRequest.pickup_longitude,
+        BookingRequest.drop_location,
+        BookingRequest.drop_latitude,
+        BookingRequest.drop_longitude,
+        BookingRequest.distance_to_cover,
+        BookingRequest.estimated_delivery_time,
+        BookingRequest.total_price,
+        BookingRequest.delivery_status,
+        BookingRequest.order_status,
+        BookingRequest.request_status,
+        BookingRequest.booking_id,
+    ),
+    "Rejected": (
+        BookingRequest.pickup_location,
+        BookingRequest.drop_location,
+        BookingRequest.distance_to_cover,
+        BookingRequest.request_status,
+        BookingRequest.booking_id,
+    ),
+    "Completed": (
+        BookingRequest.pickup_location,
+        BookingRequest.pickup_latitude,
+        BookingRequest.pickup_longitude,
+        BookingRequest.drop_location,
+        BookingRequest.drop_latitude,
+        BookingRequest.drop_longitude,
+        BookingRequest.distance_to_cover,
+        BookingRequest.estimated_delivery_time,
+        BookingRequest.total_price,
+        BookingRequest.request_status,
+        BookingRequest.booking_id,
+    ),
+    "All": (
+        BookingRequest.pickup_location,
+        BookingRequest.drop_location,
+        BookingRequest.distance_to_cover,
+        BookingRequest.delivery_status,
+        BookingRequest.order_status,
+        BookingRequest.request_status,
+        BookingRequest.booking_id,
+    ),
+}
+
+
+def compile_booking_serializer(columns):
+    """
+    Row to dict function for a projection. Rows carry the projection's
+    columns first, so zip pairs them with their keys by position and stops
+    before the pagination columns that follow.
+    """
+    keys = tuple(column.key for column in columns)
+
+    def serialize(booking):
+        return dict(zip(keys, booking))
+
+    return serialize
+
+
+DRIVER_BOOKING_SERIALIZERS = {
+    booking_filter: compile_booking_serializer(columns)
+    for booking_filter, columns in DRIVER_BOOKING_PROJECTIONS.items()
+}
+
+
+def driver_booking_projection(booking_filter: str):
+    """
+    Filter name used for booking_filter; unknown filters list all bookings.
+    """
+    return booking_filter if booking_filter in DRIVER_BOOKING_PROJECTIONS else "All"
+
+
+def driver_booking_serializer(booking_filter: str):
+    return DRIVER_BOOKING_SERIALIZERS[driver_booking_projection(booking_filter)]
 
 
 class DriverController:
@@ -29,6 +135,7 @@ class DriverController:
         driver.availability = available
         await self.db.commit()
         await self.db.refresh(driver)
+        await publish_driver_update(driver)
 
         vehicle_query = select(Vehicle).filter(Vehicle.vehicleid == vehicle_id)
         vehicle_result = await self.db.execute(vehicle_query)
@@ -44,6 +151,7 @@ class DriverController:
         vehicle.active_status = not available
         await self.db.commit()
         await self.db.refresh(vehicle)
+        await publish_vehicle_update(vehicle)
 
     async def update_driver_and_vehicle_location(
         self,
@@ -67,6 +175,7 @@ class DriverController:
         driver.current_longitude = drop_longitude
         await self.db.commit()
         await self.db.refresh(driver)
+        await publish_driver_update(driver)
 
         vehicle_query = select(Vehicle).filter(Vehicle.vehicleid == vehicle_id)
         vehicle_result = await self.db.execute(vehicle_query)
@@ -78,10 +187,12 @@ class DriverController:
                 detail="Vehicle not found",
             )
 
+        previous_location = (vehicle.current_latitude, vehicle.current_longitude)
         vehicle.current_latitude = drop_latitude
         vehicle.current_longitude = drop_longitude
         await self.db.commit()
         await self.db.refresh(vehicle)
+        await publish_vehicle_update(vehicle, previous_location=previous_location)
 
     async def create_driver(self, data: dict):
         existing_user_query = select(Driver).filter(Driver.email == data["email"])
@@ -116,6 +227,7 @@ class DriverController:
         self.db.add(new_driver)
         await self.db.commit()
         await self.db.refresh(new_driver)
+        await publish_driver_update(new_driver)
 
         return {"message": "Driver onboarded successfully"}
 
@@ -181,7 +293,15 @@ class DriverController:
         booking_filter: str = Literal[
             "All", "Pending", "Accepted", "Rejected", "Completed"
         ],
+        page_size: int = None,
+        after: tuple = None,
     ):
+        """
+        One page of the driver's bookings, newest first, with the cursor of
+        the next page. after is the (created_at, id) decoded from the
+        previous page's cursor.
+        """
+        page_size = min(page_size or BOOKING_PAGE_SIZE, BOOKING_MAX_PAGE_SIZE)
         driver_query = select(Driver).filter(Driver.driverid == driver_id)
         result = await self.db.execute(driver_query)
         driver = result.scalars().first()
@@ -191,119 +311,38 @@ class DriverController:
                 detail="Driver not found",
             )
 
-        if booking_filter == "Pending":
-            booking_query = select(
-                BookingRequest.booking_id,
-                BookingRequest.pickup_location,
-                BookingRequest.drop_location,
-                BookingRequest.distance_to_cover,
-                BookingRequest.request_status,
-            ).filter(
-                BookingRequest.driver_id == driver_id,
-                BookingRequest.request_status == "Pending",
-            )
-        elif booking_filter == "Accepted":
-            booking_query = select(
-                BookingRequest.booking_id,
-                BookingRequest.pickup_location,
-                BookingRequest.pickup_latitude,
-                BookingRequest.pickup_longitude,
-                BookingRequest.drop_location,
-                BookingRequest.drop_latitude,
-                BookingRequest.drop_longitude,
-                BookingRequest.distance_to_cover,
-                BookingRequest.estimated_delivery_time,
-                BookingRequest.total_price,
-                BookingRequest.delivery_status,
-                BookingRequest.order_status,
-                BookingRequest.request_status,
-            ).filter(
-                BookingRequest.driver_id == driver_id,
-                BookingRequest.request_status == "Accepted",
-            )
-        elif booking_filter == "Rejected":
-            booking_query = select(
-                BookingRequest.booking_id,
-                BookingRequest.pickup_location,
-                BookingRequest.drop_location,
-                BookingRequest.distance_to_cover,
-                BookingRequest.request_status,
-            ).filter(
-                BookingRequest.driver_id == driver_id,
-                BookingRequest.request_status == "Rejected",
-            )
-        elif booking_filter == "Completed":
-            booking_query = select(
-                BookingRequest.booking_id,
-                BookingRequest.pickup_location,
-                BookingRequest.pickup_latitude,
-                BookingRequest.pickup_longitude,
-                BookingRequest.drop_location,
-                BookingRequest.drop_latitude,
-                BookingRequest.drop_longitude,
-                BookingRequest.distance_to_cover,
-                BookingRequest.estimated_delivery_time,
-                BookingRequest.total_price,
-                BookingRequest.request_status,
-            ).filter(
-                BookingRequest.driver_id == driver_id,
-                BookingRequest.request_status == "Rejected",
-            )
-        else:
-            booking_query = select(
-                BookingRequest.booking_id,
-                BookingRequest.pickup_location,
-                BookingRequest.drop_location,
-                BookingRequest.distance_to_cover,
-                BookingRequest.delivery_status,
-                BookingRequest.order_status,
-                BookingRequest.request_status,
-            ).filter(
-                BookingRequest.driver_id == driver_id,
-            )
-
+        booking_query = booking_page_query(
+            self.driver_bookings_query(driver_id, booking_filter), after, page_size
+        )
         result = await self.db.execute(booking_query)
-        bookings = result.fetchall()
+        bookings, next_cursor = booking_page(result.fetchall(), page_size)
 
-        if not bookings:
+        if not bookings and after is None:
             raise HTTPException(status_code=404, detail="No bookings found")
 
-        formatted_bookings = []
-        for booking in bookings:
-            formatted_booking = {}
-
-            if hasattr(booking, "pickup_location"):
-                formatted_booking["pickup_location"] = booking.pickup_location
-            if hasattr(booking, "pickup_latitude"):
-                formatted_booking["pickup_latitude"] = booking.pickup_latitude
-            if hasattr(booking, "pickup_longitude"):
-                formatted_booking["pickup_longitude"] = booking.pickup_longitude
-            if hasattr(booking, "drop_location"):
-                formatted_booking["drop_location"] = booking.drop_location
-            if hasattr(booking, "drop_latitude"):
-                formatted_booking["drop_latitude"] = booking.drop_latitude
-            if hasattr(booking, "drop_longitude"):
-                formatted_booking["drop_longitude"] = booking.drop_longitude
-            if hasattr(booking, "distance_to_cover"):
-                formatted_booking["distance_to_cover"] = booking.distance_to_cover
-            if hasattr(booking, "estimated_delivery_time"):
-                formatted_booking["estimated_delivery_time"] = (
-                    booking.estimated_delivery_time
-                )
-            if hasattr(booking, "total_price"):
-                formatted_booking["total_price"] = booking.total_price
-            if hasattr(booking, "delivery_status"):
-                formatted_booking["delivery_status"] = booking.delivery_status
-            if hasattr(booking, "order_status"):
-                formatted_booking["order_status"] = booking.order_status
-            if hasattr(booking, "request_status"):
-                formatted_booking["request_status"] = booking.request_status
-            if hasattr(booking, "booking_id"):
-                formatted_booking["booking_id"] = booking.booking_id
+        return {
+            "bookings": list(map(driver_booking_serializer(booking_filter), bookings)),
+            "next_cursor": next_cursor,
+        }
 
-            formatted_bookings.append(formatted_booking)
+    def driver_bookings_query(self, driver_id: str, booking_filter: str):
+        projection = driver_booking_projection(booking_filter)
+        booking_query = select(
+            *DRIVER_BOOKING_PROJECTIONS[projection],
+            # Read by booking_page for the next cursor
+            BookingRequest.id,
+            BookingRequest.created_at,
+        ).filter(BookingRequest.driver_id == driver_id)
+        if projection != "All":
+            booking_query = booking_query.filter(
+                BookingRequest.request_status == projection
+            )
+        else:
+            booking_query = booking_query.filter(
+                BookingRequest.request_status.notin_(UNPRICED_REQUEST_STATUSES)
+            )
 
-        return formatted_bookings
+        return newest_bookings_first(booking_query)
 
     async def update_booking_status(
         self,
@@ -341,6 +380,12 @@ class DriverController:
                 detail="Booking not found or invalid.",
             )
 
+        if booking.request_status in UNPRICED_REQUEST_STATUSES:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Booking has not been priced.",
+            )
+
         if status_type == "Request":
             if update_to not in ["Accepted", "Rejected", "Completed"]:
                 raise HTTPException(
@@ -5,6 +5,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from config.cache import RedisCache
 from routes.driver_routes import driver_route
 from datetime import datetime, timezone
+from utils.location_buffer import location_buffer
+import asyncio
 
 app = FastAPI()
 
@@ -13,6 +15,20 @@ app.include_router(driver_route)
 cache = RedisCache()
 
 
+@app.on_event("startup")
+async def start_location_flusher():
+    app.state.location_flusher = asyncio.create_task(location_buffer.run_flusher())
+
+
+@app.on_event("shutdown")
+async def stop_location_flusher():
+    app.state.location_flusher.cancel()
+    try:
+        await location_buffer.flush()
+    except Exception as e:
+        print(f"Error flushing location pings: {e}")
+
+
 @app.get("/head")
 async def head(db: AsyncSession = Depends(get_db)):
     """
@@ -9,6 +9,9 @@ from sqlalchemy import (
     Boolean,
     ARRAY,
     ForeignKey,
+    Index,
+    Enum,
+    text,
 )
 from sqlalchemy.orm import relationship
 
@@ -46,6 +49,20 @@ class Vehicle(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        # Radius searches: availability flags, then the lat/lon bounding box
+        Index(
+            "ix_vehicles_available_location",
+            "is_available",
+            "active_status",
+            "current_latitude",
+            "current_longitude",
+        ),
+        # Watermark polling by the user-service fleet snapshot
+        Index("ix_vehicles_created_at", "created_at"),
+        Index("ix_vehicles_updated_at", "updated_at"),
+    )
+
 
 class Driver(Base):
     __tablename__ = "drivers"
@@ -67,6 +84,27 @@ class Driver(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        Index(
+            "ix_drivers_available_location",
+            "availability",
+            "current_latitude",
+            "current_longitude",
+        ),
+    )
+
+
+REQUEST_STATUSES = ("Pricing", "Pending", "Accepted", "Rejected", "Completed", "Failed")
+DELIVERY_STATUSES = (
+    "Pending Pickup",
+    "In Transit",
+    "Out for Delivery",
+    "Delivered",
+    "Canceled",
+)
+ORDER_STATUSES = ("Pending", "Received")
+PAYMENT_STATUSES = ("Pending", "Completed", "Failed", "Refunded")
+
 
 class BookingRequest(Base):
     __tablename__ = "booking_requests"
@@ -88,16 +126,56 @@ class BookingRequest(Base):
     gst = Column(Float)
     platform_fee = Column(Float)
     total_price = Column(Float)
+    # Native Postgres enums: four bytes per value instead of the label
     request_status = Column(
-        String, default="Pending"
-    )  # ("Pending", "Accepted", "Rejected", "Completed")
+        Enum(*REQUEST_STATUSES, name="booking_request_status"), default="Pending"
+    )
     delivery_status = Column(
-        String,
+        Enum(*DELIVERY_STATUSES, name="booking_delivery_status"),
         default="Pending Pickup",
-    )  # ( "Pending Pickup", "In Transit", "Out for Delivery", "Delivered", "Canceled")
-    order_status = Column(String, default="Pending")  # ("Pending", "Received")
+    )
+    order_status = Column(
+        Enum(*ORDER_STATUSES, name="booking_order_status"), default="Pending"
+    )
     payment_status = Column(
-        String, default="Completed"
-    )  # ("Pending", "Completed", "Failed", "Refunded")
+        Enum(*PAYMENT_STATUSES, name="booking_payment_status"), default="Completed"
+    )
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        # Booking history pages, newest first; id breaks ties between
+        # bookings created in the same transaction, such as bulk imports
+        Index("ix_booking_requests_user_created", "user_id", "created_at", "id"),
+        Index(
+            "ix_booking_requests_driver_status_created",
+            "driver_id",
+            "request_status",
+            "created_at",
+            "id",
+        ),
+        Index("ix_booking_requests_driver_created", "driver_id", "created_at", "id"),
+        # Pending requests are a small, hot slice of the table: the
+        # assignment window reads them oldest first, drivers newest first
+        Index(
+            "ix_booking_requests_pending",
+            "created_at",
+            "id",
+            postgresql_where=text("request_status = 'Pending'"),
+        ),
+        Index(
+            "ix_booking_requests_driver_pending",
+            "driver_id",
+            "created_at",
+            "id",
+            postgresql_where=text("request_status = 'Pending'"),
+        ),
+        # Admin reporting by status
+        Index(
+            "ix_booking_requests_statuses",
+            "request_status",
+            "delivery_status",
+            "order_status",
+            "payment_status",
+        ),
+    )
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
+from datetime import datetime
 
 
 class DriverLogin(BaseModel):
@@ -42,3 +43,10 @@ class DriverUpdate(BaseModel):
     country_code: Optional[str] = None
     mobile: Optional[str] = None
     password: Optional[str] = None
+
+
+class LocationPing(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    vehicle_id: Optional[str] = None
+    recorded_at: Optional[datetime] = None
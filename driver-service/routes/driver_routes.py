@@ -1,15 +1,21 @@
 from sqlalchemy import select
-from fastapi import APIRouter, Depends, status, HTTPException, Query, Header
+from fastapi import APIRouter, Depends, status, HTTPException, Query, Header, Body
 from fastapi.responses import JSONResponse
-from controllers.driver_controller import DriverController
+from controllers.driver_controller import DriverController, driver_booking_serializer
 from models.models import Driver
-from models.schema import DriverOnboard, DriverLogin
+from models.schema import DriverOnboard, DriverLogin, LocationPing
 from sqlalchemy.ext.asyncio import AsyncSession
 from config.database import get_db
 from utils.populate_data import populate_driver_data
-from typing import Literal
+from typing import Literal, List, Union
 
 from utils.token import verification
+from utils.streaming import wants_ndjson, ndjson_response
+from utils.pagination import decode_booking_cursor
+from utils.location_buffer import location_buffer
+from utils.idempotency import idempotent_requests
+
+MAX_PINGS_PER_REQUEST = 1000
 
 # Driver route
 driver_route = APIRouter(prefix="/driver", tags=["drivers"])
@@ -86,7 +92,11 @@ async def get_driver_profile(
 async def get_driver_bookings(
     driver_id: str = Query(...),
     request_status: str = Query(...),
+    stream: bool = Query(False, description="Stream bookings as NDJSON"),
+    limit: int = Query(None, ge=1, description="Page size, capped by the server"),
+    cursor: str = Query(None, description="X-Next-Cursor of the previous page"),
     authorization: str = Header(...),
+    accept: str = Header(None),
     db: AsyncSession = Depends(get_db),
 ):
     query = select(Driver).filter(Driver.driverid == driver_id)
@@ -100,11 +110,30 @@ async def get_driver_bookings(
 
     verification(token=authorization.split(" ")[1], role="driver", entity_id=driver_id)
     driver_instance = DriverController(db)
+    if wants_ndjson(accept, stream):
+        return ndjson_response(
+            driver_instance.driver_bookings_query(driver_id, request_status),
+            driver_booking_serializer(request_status),
+        )
+
     try:
-        driver_profile = await driver_instance.get_driver_bookings(
-            driver_id, request_status
+        after = decode_booking_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+    try:
+        driver_bookings = await driver_instance.get_driver_bookings(
+            driver_id, request_status, limit, after
+        )
+        headers = {}
+        if driver_bookings["next_cursor"]:
+            headers["X-Next-Cursor"] = driver_bookings["next_cursor"]
+        return JSONResponse(
+            content=driver_bookings["bookings"], status_code=200, headers=headers
         )
-        return JSONResponse(content=driver_profile, status_code=200)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -119,6 +148,7 @@ async def update_booking_status(
     status_type: str = Query(...),
     update_to: str = Query(...),
     authorization: str = Header(...),
+    idempotency_key: str = Header(None),
     db: AsyncSession = Depends(get_db),
 ):
     query = select(Driver).filter(Driver.driverid == driver_id)
@@ -132,17 +162,62 @@ async def update_booking_status(
 
     verification(token=authorization.split(" ")[1], role="driver", entity_id=driver_id)
     driver_instance = DriverController(db)
-    try:
-        response = await driver_instance.update_booking_status(
-            driver_id, booking_id, status_type, update_to
-        )
-        return JSONResponse(content=response, status_code=200)
-    except Exception as e:
+
+    async def update():
+        try:
+            response = await driver_instance.update_booking_status(
+                driver_id, booking_id, status_type, update_to
+            )
+            return response, 200
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Server Error: Unable to update booking status.",
+            )
+
+    # Retries with the same Idempotency-Key get the first result back
+    return await idempotent_requests.respond(
+        f"driver-booking:{driver_id}",
+        idempotency_key,
+        {
+            "booking_id": booking_id,
+            "status_type": status_type,
+            "update_to": update_to,
+        },
+        update,
+    )
+
+
+@driver_route.post("/location")
+async def ingest_location_pings(
+    driver_id: str = Query(...),
+    pings: Union[LocationPing, List[LocationPing]] = Body(...),
+    authorization: str = Header(...),
+):
+    """
+    Accept one GPS ping or a batch of them. Pings are buffered and written
+    to the database in bulk, so this does not touch the database itself.
+    """
+    verification(token=authorization.split(" ")[1], role="driver", entity_id=driver_id)
+
+    if isinstance(pings, LocationPing):
+        pings = [pings]
+    if len(pings) > MAX_PINGS_PER_REQUEST:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Server Error: Unable to update booking status.",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_PINGS_PER_REQUEST} pings per request",
         )
 
+    location_buffer.add(driver_id, pings)
+    return JSONResponse(
+        content={"accepted": len(pings)}, status_code=status.HTTP_202_ACCEPTED
+    )
+
+
+@driver_route.get("/location/stats")
+async def location_buffer_stats():
+    return JSONResponse(content=location_buffer.stats(), status_code=200)
+
 
 @driver_route.post("/populate")
 async def populate_drivers(num_drivers: int = 1000, db: AsyncSession = Depends(get_db)):
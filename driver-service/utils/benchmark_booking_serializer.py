@@ -0,0 +1,110 @@
+"""
+Micro-benchmark of the driver booking serializers, on SQLAlchemy rows built
+in memory so that only serialization is timed.
+
+    python -m utils.benchmark_booking_serializer [rows] [filter]
+"""
+
+import sys
+import timeit
+from datetime import datetime, timezone
+from sqlalchemy.engine import IteratorResult
+from sqlalchemy.engine.result import SimpleResultMetaData
+from controllers.driver_controller import (
+    DRIVER_BOOKING_PROJECTIONS,
+    driver_booking_serializer,
+)
+
+BOOKING_FIELDS = (
+    "pickup_location",
+    "pickup_latitude",
+    "pickup_longitude",
+    "drop_location",
+    "drop_latitude",
+    "drop_longitude",
+    "distance_to_cover",
+    "estimated_delivery_time",
+    "total_price",
+    "delivery_status",
+    "order_status",
+    "request_status",
+    "booking_id",
+)
+
+
+def format_driver_booking_hasattr(booking):
+    """
+    The serializer this benchmark measures against: one hasattr check per
+    field the row might carry.
+    """
+    formatted_booking = {}
+    for field in BOOKING_FIELDS:
+        if hasattr(booking, field):
+            formatted_booking[field] = getattr(booking, field)
+    return formatted_booking
+
+
+def sample_rows(booking_filter: str, count: int):
+    columns = DRIVER_BOOKING_PROJECTIONS[booking_filter]
+    values = {
+        "pickup_location": "Pune",
+        "pickup_latitude": 18.52,
+        "pickup_longitude": 73.85,
+        "drop_location": "Mumbai",
+        "drop_latitude": 19.07,
+        "drop_longitude": 72.87,
+        "distance_to_cover": 151.2,
+        "estimated_delivery_time": 3.0,
+        "total_price": 2177.28,
+        "delivery_status": "Pending Pickup",
+        "order_status": "Pending",
+        "request_status": booking_filter,
+    }
+    created_at = datetime.now(timezone.utc)
+    keys = [column.key for column in columns] + ["id", "created_at"]
+    rows = (
+        tuple(
+            f"booking-{index}" if column.key == "booking_id" else values[column.key]
+            for column in columns
+        )
+        + (index, created_at)
+        for index in range(count)
+    )
+    return IteratorResult(SimpleResultMetaData(keys), rows).all()
+
+
+def main(count: int, booking_filter: str):
+    rows = sample_rows(booking_filter, count)
+    serialize = driver_booking_serializer(booking_filter)
+    assert list(map(serialize, rows)) == [
+        format_driver_booking_hasattr(row) for row in rows
+    ]
+
+    timings = {
+        "hasattr loop": min(
+            timeit.repeat(
+                lambda: [format_driver_booking_hasattr(row) for row in rows],
+                number=1,
+                repeat=5,
+            )
+        ),
+        "compiled serializer": min(
+            timeit.repeat(lambda: list(map(serialize, rows)), number=1, repeat=5)
+        ),
+    }
+    print(f"{count} {booking_filter} rows")
+    for name, seconds in timings.items():
+        print(
+            f"{name:>20}: {seconds * 1000:8.1f} ms  {seconds / count * 1e6:6.2f} us/row"
+        )
+    print(
+        f"{'speedup':>20}: "
+        f"{timings['hasattr loop'] / timings['compiled serializer']:8.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+        sys.argv[2] if len(sys.argv) > 2 else "Accepted",
+    )
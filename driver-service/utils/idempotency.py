@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from config.cache import RedisCache
+
+load_dotenv()
+
+IDEMPOTENCY_PREFIX = "idempotency"
+
+cache = RedisCache()
+
+
+class IdempotentRequests:
+    """
+    Replays the stored response of a request retried with the same
+    Idempotency-Key header instead of running it again.
+
+    - The first request claims the key with SET NX and runs; its response
+      is stored under the key for IDEMPOTENCY_TTL_SECONDS
+    - Duplicates arriving while it runs wait for that response
+    - Server errors release the key, so a retry runs the request again
+    - Reusing a key for a different request body is rejected
+    - Without Redis the request runs unguarded, like a request without a key
+    """
+
+    def __init__(self, cache: RedisCache):
+        self.cache = cache
+        self.expiry = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 24 * 60 * 60))
+        # How long a claim lives if its request dies without releasing it
+        self.claim_expiry = int(os.getenv("IDEMPOTENCY_CLAIM_SECONDS", 30))
+        self.poll_interval = 0.05
+
+    def fingerprint(self, request_data):
+        return hashlib.sha256(
+            json.dumps(request_data, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    async def respond(self, scope: str, idempotency_key: str, request_data, handler):
+        """
+        handler() returns (content, status_code) and runs at most once per
+        scope and key.
+        """
+        if not idempotency_key:
+            content, status_code = await handler()
+            return JSONResponse(content=content, status_code=status_code)
+
+        key = f"{IDEMPOTENCY_PREFIX}:{scope}:{idempotency_key}"
+        fingerprint = self.fingerprint(request_data)
+        deadline = time.monotonic() + self.claim_expiry
+
+        while True:
+            stored = await self.cache.get_cache(key)
+            if stored is None:
+                claim = str({"state": "running", "fingerprint": fingerprint})
+                claimed = await self.cache.set_if_absent(key, claim, self.claim_expiry)
+                if claimed is None:
+                    content, status_code = await handler()
+                    return JSONResponse(content=content, status_code=status_code)
+                if claimed:
+                    return await self.run(key, fingerprint, handler)
+
+            elif stored["fingerprint"] != fingerprint:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Idempotency-Key was already used for a different request",
+                )
+
+            elif stored["state"] == "done":
+                return JSONResponse(
+                    content=stored["content"],
+                    status_code=stored["status_code"],
+                    headers={"Idempotent-Replayed": "true"},
+                )
+
+            if time.monotonic() > deadline:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still in progress",
+                )
+            await asyncio.sleep(self.poll_interval)
+
+    async def run(self, key, fingerprint, handler):
+        try:
+            content, status_code = await handler()
+        except HTTPException as e:
+            if e.status_code >= 500:
+                await self.cache.delete(key)
+            else:
+                await self.store(key, fingerprint, {"detail": e.detail}, e.status_code)
+            raise
+        except BaseException:
+            await self.cache.delete(key)
+            raise
+
+        await self.store(key, fingerprint, content, status_code)
+        return JSONResponse(content=content, status_code=status_code)
+
+    async def store(self, key, fingerprint, content, status_code):
+        await self.cache.set_cache(
+            key,
+            str(
+                {
+                    "state": "done",
+                    "fingerprint": fingerprint,
+                    "content": content,
+                    "status_code": status_code,
+                }
+            ),
+            expiry=self.expiry,
+        )
+
+
+idempotent_requests = IdempotentRequests(cache)
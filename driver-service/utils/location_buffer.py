@@ -0,0 +1,282 @@
+import asyncio
+import os
+import time
+from dotenv import load_dotenv
+from sqlalchemy import update, values, column, exists, select, String, Float
+from config.cache import (
+    RedisCache,
+    VEHICLE_UPDATES_CHANNEL,
+    DRIVER_UPDATES_CHANNEL,
+    VEHICLE_LOCATIONS_KEY,
+    DRIVER_LOCATIONS_KEY,
+    SEARCH_INVALIDATION_ALL_TAG,
+    search_invalidation_tag,
+)
+from config.database import SessionLocal
+from models.models import Driver, Vehicle, BookingRequest
+
+load_dotenv()
+
+cache = RedisCache()
+
+
+class LocationBuffer:
+    """
+    In-memory buffer of driver GPS pings, kept in each worker.
+
+    - Pings are coalesced to the latest position per driver (and vehicle)
+    - A ping moves a vehicle only if the driver has an accepted booking
+      with it that is not delivered or canceled; this is checked in the
+      flush UPDATE itself, so ingesting pings never reads the database
+    - Every flush_interval the buffer is written with one UPDATE ... FROM
+      (VALUES ...) per table and a single commit, however many pings arrived
+    - After the commit, the shared geo index, the search cache and the
+      user-service indexes are updated once for the whole batch
+    """
+
+    # Rows per UPDATE statement, well under the driver's bind parameter limit
+    CHUNK_SIZE = 5000
+
+    def __init__(self):
+        self.flush_interval = float(os.getenv("LOCATION_FLUSH_INTERVAL_SECONDS", 2))
+        self.drivers = {}
+        self.vehicles = {}
+        self.received = 0
+        self.flushed = 0
+        self.vehicle_pings_dropped = 0
+        self._flush_lock = None
+
+    def add(self, driver_id: str, pings):
+        """
+        pings: objects with latitude, longitude and optional vehicle_id and
+        recorded_at. Older pings than the buffered one are dropped.
+        """
+        arrived_at = time.time()
+        for ping in pings:
+            # A device clock running ahead must not pin an old position
+            recorded_at = (
+                min(ping.recorded_at.timestamp(), arrived_at)
+                if ping.recorded_at
+                else arrived_at
+            )
+            position = (recorded_at, ping.latitude, ping.longitude)
+
+            buffered = self.drivers.get(driver_id)
+            if buffered is None or buffered[0] <= recorded_at:
+                self.drivers[driver_id] = position
+
+            if ping.vehicle_id:
+                # Keyed by driver too, so a driver without the vehicle cannot
+                # displace the position reported by the one driving it
+                vehicle_key = (ping.vehicle_id, driver_id)
+                buffered = self.vehicles.get(vehicle_key)
+                if buffered is None or buffered[0] <= recorded_at:
+                    self.vehicles[vehicle_key] = position
+
+        self.received += len(pings)
+
+    def _restore(self, drivers, vehicles):
+        """
+        Put back the pings of a failed flush unless newer ones arrived since.
+        """
+        for buffered, failed in ((self.drivers, drivers), (self.vehicles, vehicles)):
+            for member, position in failed.items():
+                if member not in buffered or buffered[member][0] < position[0]:
+                    buffered[member] = position
+
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            drivers, self.drivers = self.drivers, {}
+            vehicles, self.vehicles = self.vehicles, {}
+            if not drivers and not vehicles:
+                return 0
+
+            try:
+                async with SessionLocal() as session:
+                    driver_rows = await self._update_drivers(session, drivers)
+                    vehicle_rows = await self._update_vehicles(session, vehicles)
+                    await session.commit()
+            except Exception:
+                self._restore(drivers, vehicles)
+                raise
+
+            self.vehicle_pings_dropped += len(vehicles) - len(vehicle_rows)
+            await self._propagate(driver_rows, vehicle_rows)
+            self.flushed += len(drivers) + len(vehicles)
+            return len(drivers) + len(vehicles)
+
+    async def _update_drivers(self, session, drivers):
+        table = Driver.__table__
+        rows = []
+        items = list(drivers.items())
+        for start in range(0, len(items), self.CHUNK_SIZE):
+            positions = values(
+                column("driverid", String),
+                column("latitude", Float),
+                column("longitude", Float),
+                name="positions",
+            ).data(
+                [
+                    (driver_id, latitude, longitude)
+                    for driver_id, (_, latitude, longitude) in items[
+                        start : start + self.CHUNK_SIZE
+                    ]
+                ]
+            )
+            result = await session.execute(
+                update(table)
+                .where(table.c.driverid == positions.c.driverid)
+                .values(
+                    current_latitude=positions.c.latitude,
+                    current_longitude=positions.c.longitude,
+                )
+                .returning(
+                    table.c.driverid,
+                    table.c.current_latitude,
+                    table.c.current_longitude,
+                    table.c.availability,
+                )
+            )
+            rows += result.all()
+        return rows
+
+    async def _update_vehicles(self, session, vehicles):
+        """
+        Joining the table to itself returns each vehicle's previous position,
+        whose search cache cell also has to be cleared. Positions from
+        drivers who are not driving the vehicle match no booking and are
+        skipped.
+        """
+        table = Vehicle.__table__
+        previous = table.alias("previous")
+        bookings = BookingRequest.__table__
+        rows = []
+        items = list(vehicles.items())
+        for start in range(0, len(items), self.CHUNK_SIZE):
+            positions = values(
+                column("vehicleid", String),
+                column("driverid", String),
+                column("latitude", Float),
+                column("longitude", Float),
+                name="positions",
+            ).data(
+                [
+                    (vehicle_id, driver_id, latitude, longitude)
+                    for (vehicle_id, driver_id), (_, latitude, longitude) in items[
+                        start : start + self.CHUNK_SIZE
+                    ]
+                ]
+            )
+            driving = exists(
+                select(bookings.c.id).where(
+                    bookings.c.vehicle_id == positions.c.vehicleid,
+                    bookings.c.driver_id == positions.c.driverid,
+                    bookings.c.request_status == "Accepted",
+                    bookings.c.delivery_status.notin_(["Delivered", "Canceled"]),
+                )
+            )
+            result = await session.execute(
+                update(table)
+                .where(
+                    table.c.vehicleid == positions.c.vehicleid,
+                    previous.c.id == table.c.id,
+                    driving,
+                )
+                .values(
+                    current_latitude=positions.c.latitude,
+                    current_longitude=positions.c.longitude,
+                )
+                .returning(
+                    table.c.vehicleid,
+                    table.c.current_latitude,
+                    table.c.current_longitude,
+                    table.c.is_available,
+                    table.c.active_status,
+                    previous.c.current_latitude.label("previous_latitude"),
+                    previous.c.current_longitude.label("previous_longitude"),
+                )
+            )
+            rows += result.all()
+        return rows
+
+    async def _propagate(self, driver_rows, vehicle_rows):
+        if driver_rows:
+            await cache.geo_add(
+                DRIVER_LOCATIONS_KEY,
+                [
+                    (row.driverid, row.current_latitude, row.current_longitude)
+                    for row in driver_rows
+                    if row.availability
+                ],
+            )
+            await cache.geo_remove(
+                DRIVER_LOCATIONS_KEY,
+                [row.driverid for row in driver_rows if not row.availability],
+            )
+            await cache.publish(
+                DRIVER_UPDATES_CHANNEL, {"source": "pings", "drivers": len(driver_rows)}
+            )
+
+        if vehicle_rows:
+            await cache.geo_add(
+                VEHICLE_LOCATIONS_KEY,
+                [
+                    (row.vehicleid, row.current_latitude, row.current_longitude)
+                    for row in vehicle_rows
+                    if row.is_available and row.active_status
+                ],
+            )
+            await cache.geo_remove(
+                VEHICLE_LOCATIONS_KEY,
+                [
+                    row.vehicleid
+                    for row in vehicle_rows
+                    if not (row.is_available and row.active_status)
+                ],
+            )
+
+            tags = {SEARCH_INVALIDATION_ALL_TAG}
+            for row in vehicle_rows:
+                tags.add(
+                    search_invalidation_tag(row.current_latitude, row.current_longitude)
+                )
+                if (
+                    row.previous_latitude is not None
+                    and row.previous_longitude is not None
+                ):
+                    tags.add(
+                        search_invalidation_tag(
+                            row.previous_latitude, row.previous_longitude
+                        )
+                    )
+            await cache.invalidate_tags(tags)
+            await cache.publish(
+                VEHICLE_UPDATES_CHANNEL,
+                {"source": "pings", "vehicles": len(vehicle_rows)},
+            )
+
+    async def run_flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error flushing location pings: {e}")
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "flushed": self.flushed,
+            "vehicle_pings_dropped": self.vehicle_pings_dropped,
+            "buffered_drivers": len(self.drivers),
+            "buffered_vehicles": len(self.vehicles),
+            "flush_interval_seconds": self.flush_interval,
+        }
+
+
+location_buffer = LocationBuffer()
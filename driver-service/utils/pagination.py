@@ -0,0 +1,99 @@
+import base64
+import json
+import math
+from datetime import datetime
+from sqlalchemy import tuple_
+from models.models import BookingRequest
+
+
+def encode_cursor(values: dict):
+    """
+    Opaque, URL-safe cursor for the next page of a listing.
+    """
+    payload = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """
+    Inverse of encode_cursor. Raises ValueError on anything it did not produce.
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(values, dict):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def decode_search_cursor(cursor: str, max_served: int):
+    """
+    (total_price, vehicle_id, served) of the last vehicle of the previous
+    search page, with served at most max_served. Raises ValueError on an
+    invalid cursor.
+    """
+    values = decode_cursor(cursor)
+    total_price = values.get("total_price")
+    vehicle_id = values.get("vehicle_id")
+    served = values.get("served")
+    if (
+        not isinstance(total_price, (int, float))
+        or isinstance(total_price, bool)
+        or not math.isfinite(total_price)
+        or not isinstance(vehicle_id, str)
+        or not isinstance(served, int)
+        or isinstance(served, bool)
+        or not 0 <= served <= max_served
+    ):
+        raise ValueError("Invalid cursor")
+    return {
+        "total_price": float(total_price),
+        "vehicle_id": vehicle_id,
+        "served": served,
+    }
+
+
+def newest_bookings_first(query):
+    return query.order_by(BookingRequest.created_at.desc(), BookingRequest.id.desc())
+
+
+def decode_booking_cursor(cursor: str):
+    """
+    (created_at, id) of the last booking of the previous page. Raises
+    ValueError on an invalid cursor.
+    """
+    values = decode_cursor(cursor)
+    try:
+        return datetime.fromisoformat(values["created_at"]), int(values["id"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def booking_page_query(query, after, page_size: int):
+    """
+    Keyset page of a booking listing ordered by newest_bookings_first: the
+    bookings strictly older than the (created_at, id) in after. One extra
+    row is fetched to tell whether another page exists.
+    """
+    if after is not None:
+        query = query.filter(
+            tuple_(BookingRequest.created_at, BookingRequest.id) < tuple_(*after)
+        )
+    return query.limit(page_size + 1)
+
+
+def booking_page(rows, page_size: int):
+    """
+    (rows of the page, cursor of the next page or None).
+    """
+    if len(rows) <= page_size:
+        return rows, None
+
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, encode_cursor(
+        {"created_at": last.created_at.isoformat(), "id": last.id}
+    )
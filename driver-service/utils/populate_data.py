@@ -6,6 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 import random
 import logging
 from sqlalchemy.exc import IntegrityError
+from utils.fleet_events import publish_driver_update
 
 fake = Faker("en_IN")
 
@@ -74,6 +75,7 @@ async def populate_driver_data(db: AsyncSession, num_drivers: int = 1000):
 
             db.add(driver)
             await db.commit()
+            await publish_driver_update(driver)
             drivers_added += 1
 
         except IntegrityError as e:
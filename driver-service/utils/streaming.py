@@ -0,0 +1,31 @@
+import json
+from fastapi.responses import StreamingResponse
+from config.database import SessionLocal
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def wants_ndjson(accept: str = None, stream: bool = False):
+    """
+    Streaming is opt-in, through the Accept header or a ?stream=true flag.
+    """
+    return stream or (accept is not None and NDJSON_MEDIA_TYPE in accept)
+
+
+async def stream_rows(query, serialize, batch_size: int = 500):
+    """
+    Read rows from a server-side cursor and emit one JSON line per row.
+
+    The request's session is closed once the route returns, so the stream
+    opens its own for as long as the client is reading.
+    """
+    async with SessionLocal() as session:
+        result = await session.stream(query.execution_options(yield_per=batch_size))
+        async for row in result:
+            yield json.dumps(serialize(row)) + "\n"
+
+
+def ndjson_response(query, serialize):
+    return StreamingResponse(
+        stream_rows(query, serialize), media_type=NDJSON_MEDIA_TYPE
+    )
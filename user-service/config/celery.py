@@ -3,7 +3,6 @@ import asyncio
 import os
 from dotenv import load_dotenv
 
-
 load_dotenv()
 
 CELERY_BROKER = os.getenv("CELERY_BROKER")
@@ -23,8 +22,21 @@ celery_app.conf.update(
     accept_content=["json"],
     timezone="UTC",
     enable_utc=True,
+    include=["utils.booking_tasks"],
 )
 
+# Each worker process keeps one event loop, so the database engine and the
+# maps client it creates can be reused across tasks
+worker_loop = None
+
+
+def run_in_worker_loop(coroutine):
+    global worker_loop
+    if worker_loop is None:
+        worker_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(worker_loop)
+    return worker_loop.run_until_complete(coroutine)
+
 
 async def async_task():
     await asyncio.sleep(10)
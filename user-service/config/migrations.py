@@ -0,0 +1,164 @@
+"""
+Bring tables created by older versions up to the models. create_all only
+creates missing tables, so run this once before deploying a version that
+changes existing ones:
+
+    python -m config.migrations [--map booking_requests.order_status:Done=Received]
+"""
+
+import argparse
+import asyncio
+import sys
+from sqlalchemy import Enum, text
+from config.database import Base, engine
+import models.models  # noqa: F401, registers the tables on Base
+
+# Held while migrating, so services migrating together run one at a time
+SCHEMA_LOCK_ID = 5461802
+
+
+class UnknownValuesError(Exception):
+    pass
+
+
+def quote(value: str):
+    return "'" + value.replace("'", "''") + "'"
+
+
+async def unknown_values(conn, table, column, known):
+    labels = ", ".join(quote(label) for label in known)
+    result = await conn.execute(
+        text(
+            f"SELECT DISTINCT {column.name} FROM {table.name} "
+            f"WHERE {column.name} IS NOT NULL AND {column.name} NOT IN ({labels})"
+        )
+    )
+    return sorted(result.scalars().all())
+
+
+async def migrate_schema(conn, value_map: dict = None):
+    """
+    - Converts String columns that the models now declare as enums, in one
+      ALTER TABLE per table
+    - Values outside an enum abort the migration, listing them, unless
+      value_map maps them: {(table, column): {old value: label}}
+    - Creates indexes the models declare but the database lacks
+    """
+    value_map = value_map or {}
+    await conn.execute(
+        text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": SCHEMA_LOCK_ID}
+    )
+    await conn.run_sync(Base.metadata.create_all)
+
+    for table in Base.metadata.sorted_tables:
+        column_types = dict(
+            (
+                await conn.execute(
+                    text(
+                        "SELECT column_name, data_type FROM information_schema.columns "
+                        "WHERE table_name = :table_name"
+                    ),
+                    {"table_name": table.name},
+                )
+            ).all()
+        )
+        conversions, problems = [], []
+        for column in table.columns:
+            if not isinstance(column.type, Enum):
+                continue
+            if column_types.get(column.name) != "character varying":
+                continue
+
+            mapping = value_map.get((table.name, column.name), {})
+            bad_targets = sorted(set(mapping.values()) - set(column.type.enums))
+            if bad_targets:
+                problems.append(
+                    f"{table.name}.{column.name}: {bad_targets} are not labels of "
+                    f"{column.type.name} {list(column.type.enums)}"
+                )
+                continue
+            unknown = await unknown_values(
+                conn, table, column, [*column.type.enums, *mapping]
+            )
+            if unknown:
+                problems.append(
+                    f"{table.name}.{column.name}: unknown values {unknown}; map "
+                    f"them to one of {list(column.type.enums)} with --map"
+                )
+                continue
+
+            await conn.run_sync(column.type.create, checkfirst=True)
+            mapped = " ".join(
+                f"WHEN {quote(old)} THEN {quote(new)}" for old, new in mapping.items()
+            )
+            value = (
+                f"CASE {column.name} {mapped} ELSE {column.name} END"
+                if mapping
+                else column.name
+            )
+            conversions.append(
+                f"ALTER COLUMN {column.name} TYPE {column.type.name} "
+                f"USING ({value})::{column.type.name}"
+            )
+
+        if problems:
+            raise UnknownValuesError(
+                "Nothing was migrated:\n" + "\n".join(f"  {p}" for p in problems)
+            )
+        if conversions:
+            await conn.execute(
+                text(f"ALTER TABLE {table.name} " + ", ".join(conversions))
+            )
+
+        for index in table.indexes:
+            await conn.run_sync(index.create, checkfirst=True)
+
+
+def parse_value_map(entries):
+    """
+    "table.column:old=new" entries to migrate_schema's value_map.
+    """
+    value_map = {}
+    for entry in entries:
+        try:
+            target, mapping = entry.split(":", 1)
+            table_name, column_name = target.split(".", 1)
+            old, new = mapping.split("=", 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                f"Invalid --map {entry!r}, expected table.column:old=new"
+            )
+        value_map.setdefault((table_name, column_name), {})[old] = new
+    return value_map
+
+
+async def main(value_map):
+    try:
+        # One transaction: a failed migration leaves the schema untouched
+        async with engine.begin() as conn:
+            await migrate_schema(conn, value_map)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate the database schema")
+    parser.add_argument(
+        "--map",
+        action="append",
+        default=[],
+        metavar="TABLE.COLUMN:OLD=NEW",
+        help="Convert a value outside an enum to one of its labels",
+    )
+    arguments = parser.parse_args()
+    try:
+        value_map = parse_value_map(arguments.map)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    try:
+        asyncio.run(main(value_map))
+    except UnknownValuesError as e:
+        print(e)
+        sys.exit(1)
+    print("Schema is up to date")
@@ -0,0 +1,299 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.models import BookingRequest, Vehicle
+from fastapi import HTTPException, status
+from sqlalchemy import select, update, bindparam, func
+from config.cache import RedisCache
+from config.database import SessionLocal
+from utils.assignment import cheapest_per_row, min_cost_assignment
+from utils.driver_index import driver_index
+from utils.fleet_snapshot import fleet_snapshot
+from utils.helpers import LogisticsCalculations
+from utils.detour_model import detour_model
+import asyncio
+import numpy as np
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ASSIGNMENT_LOCK_KEY = "booking-assignment:lock"
+
+# Estimated price keys and the booking columns that store them
+PRICE_COLUMNS = {
+    "total_distance_km": "distance_to_cover",
+    "estimated_delivery_time": "estimated_delivery_time",
+    "base_price": "base_price",
+    "gst": "gst",
+    "platform_fee": "platform_fee",
+    "total_price": "total_price",
+}
+
+
+class AssignmentController:
+    """
+    Batch matching of pending bookings to vehicles and drivers.
+
+    - Vehicles are matched to bookings on the estimated total price, which
+      already charges the vehicle's distance to the pickup point
+    - Drivers are then matched to the chosen vehicles on their distance to it
+    - Each booking only considers its cheapest nearby vehicles and each
+      vehicle its nearest drivers, which keeps both cost matrices sparse
+    - A booking is only moved to vehicles at least as large as the one the
+      user booked, and its stored price only ever goes down
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.radius = float(os.getenv("SEARCH_RADIUS_KM", 100))
+        self.logistic_calculator = LogisticsCalculations()
+        self.window = int(os.getenv("ASSIGNMENT_WINDOW", 2000))
+        self.vehicles_per_booking = int(
+            os.getenv("ASSIGNMENT_VEHICLES_PER_BOOKING", 25)
+        )
+        self.drivers_per_vehicle = int(os.getenv("ASSIGNMENT_DRIVERS_PER_VEHICLE", 25))
+
+    async def pending_bookings(self):
+        bookings_query = (
+            select(
+                BookingRequest.id,
+                BookingRequest.pickup_latitude,
+                BookingRequest.pickup_longitude,
+                BookingRequest.drop_latitude,
+                BookingRequest.drop_longitude,
+                func.coalesce(Vehicle.capacity_in_kg, 0).label("capacity_in_kg"),
+                *(getattr(BookingRequest, column) for column in PRICE_COLUMNS.values()),
+            )
+            .join(Vehicle, Vehicle.vehicleid == BookingRequest.vehicle_id)
+            .filter(
+                BookingRequest.request_status == "Pending",
+                BookingRequest.pickup_latitude.isnot(None),
+                BookingRequest.pickup_longitude.isnot(None),
+                BookingRequest.drop_latitude.isnot(None),
+                BookingRequest.drop_longitude.isnot(None),
+            )
+            .order_by(BookingRequest.created_at, BookingRequest.id)
+            .limit(self.window)
+        )
+        result = await self.db.execute(bookings_query)
+        return result.all()
+
+    def vehicle_edges(self, bookings):
+        """
+        (booking, snapshot position, total price) for the cheapest vehicles
+        within the search radius of every booking.
+        """
+        if not bookings:
+            return (np.empty(0, dtype=np.int64),) * 2 + (np.empty(0),)
+
+        candidate_sets = [
+            fleet_snapshot.candidates(
+                booking.pickup_latitude,
+                booking.pickup_longitude,
+                self.vehicles_per_booking,
+                self.radius,
+                booking.capacity_in_kg,
+            )
+            for booking in bookings
+        ]
+        counts = [len(candidates) for candidates in candidate_sets]
+        rows = np.repeat(np.arange(len(bookings)), counts)
+        cols = np.concatenate(candidate_sets).astype(np.int64)
+
+        def per_edge(attribute):
+            return np.array([getattr(booking, attribute) for booking in bookings])[rows]
+
+        estimated_prices = self.logistic_calculator.calculate_estimated_prices(
+            fleet_snapshot.latitudes[cols],
+            fleet_snapshot.longitudes[cols],
+            per_edge("pickup_latitude"),
+            per_edge("pickup_longitude"),
+            per_edge("drop_latitude"),
+            per_edge("drop_longitude"),
+            fleet_snapshot.fuel_types[cols],
+        )
+
+        within = estimated_prices["distance_from_pickup"] <= self.radius
+        return cheapest_per_row(
+            rows[within],
+            cols[within],
+            estimated_prices["total_price"][within],
+            self.vehicles_per_booking,
+        )
+
+    def proposal_prices(self, bookings, booking_rows, vehicle_positions):
+        """
+        Prices to store with the matched (booking, vehicle) pairs: the new
+        vehicle's estimate, the one vehicle_edges matched on, when it is
+        cheaper than the stored price, and the stored price otherwise.
+        """
+        pickup_lats, pickup_lons, drop_lats, drop_lons = (
+            np.array(
+                [
+                    (
+                        bookings[row].pickup_latitude,
+                        bookings[row].pickup_longitude,
+                        bookings[row].drop_latitude,
+                        bookings[row].drop_longitude,
+                    )
+                    for row in booking_rows.tolist()
+                ],
+                dtype=np.float64,
+            )
+            .reshape(-1, 4)
+            .T
+        )
+        estimated_prices = self.logistic_calculator.calculate_estimated_prices(
+            fleet_snapshot.latitudes[vehicle_positions],
+            fleet_snapshot.longitudes[vehicle_positions],
+            pickup_lats,
+            pickup_lons,
+            drop_lats,
+            drop_lons,
+            fleet_snapshot.fuel_types[vehicle_positions],
+        )
+        estimated_prices["estimated_delivery_time"] = np.floor(
+            estimated_prices["total_distance_km"] / detour_model.speed_kmph
+        )
+        stored_prices = {
+            key: np.array(
+                [getattr(bookings[row], column) for row in booking_rows.tolist()],
+                dtype=np.float64,
+            )
+            for key, column in PRICE_COLUMNS.items()
+        }
+        cheaper = ~(stored_prices["total_price"] <= estimated_prices["total_price"])
+        return {
+            column: np.where(
+                cheaper, estimated_prices[key], stored_prices[key]
+            ).tolist()
+            for key, column in PRICE_COLUMNS.items()
+        }
+
+    def driver_edges(self, vehicle_positions):
+        """
+        (vehicle, driver index position, distance) for the nearest available
+        drivers of every vehicle.
+        """
+        rows, cols, costs = [], [], []
+        for row, position in enumerate(vehicle_positions.tolist()):
+            drivers, distances = driver_index.nearest(
+                fleet_snapshot.latitudes[position],
+                fleet_snapshot.longitudes[position],
+                self.drivers_per_vehicle,
+                self.radius,
+            )
+            rows.append(np.full(len(drivers), row))
+            cols.append(drivers)
+            costs.append(distances)
+
+        if not rows:
+            return (np.empty(0, dtype=np.int64),) * 2 + (np.empty(0),)
+        return np.concatenate(rows), np.concatenate(cols), np.concatenate(costs)
+
+    async def assign_pending_bookings(self):
+        """
+        Solve one window of pending bookings and write the proposed vehicle
+        and driver of every booking that got both. Bookings keep their
+        "Pending" status, so drivers still accept or reject them.
+        """
+        try:
+            started_at = time.perf_counter()
+            bookings = await self.pending_bookings()
+            await fleet_snapshot.ensure_fresh()
+            await driver_index.ensure_fresh()
+            solve_started_at = time.perf_counter()
+
+            rows, cols, prices = self.vehicle_edges(bookings)
+            booking_rows, vehicle_positions = min_cost_assignment(
+                rows, cols, prices, len(bookings), fleet_snapshot.size
+            )
+
+            rows, cols, distances = self.driver_edges(vehicle_positions)
+            vehicle_rows, driver_positions = min_cost_assignment(
+                rows, cols, distances, len(vehicle_positions), driver_index.size
+            )
+            booking_rows = booking_rows[vehicle_rows]
+            vehicle_positions = vehicle_positions[vehicle_rows]
+            solved_at = time.perf_counter()
+
+            prices = self.proposal_prices(bookings, booking_rows, vehicle_positions)
+            proposals = [
+                {
+                    "booking_pk": bookings[row].id,
+                    "proposed_vehicle_id": vehicle_id,
+                    "proposed_driver_id": driver_id,
+                    **{
+                        f"proposed_{key}": values[index]
+                        for key, values in prices.items()
+                    },
+                }
+                for index, (row, vehicle_id, driver_id) in enumerate(
+                    zip(
+                        booking_rows.tolist(),
+                        fleet_snapshot.vehicle_ids[vehicle_positions].tolist(),
+                        driver_index.driver_ids[driver_positions].tolist(),
+                    )
+                )
+            ]
+
+            if proposals:
+                # Bookings accepted or rejected while solving are left alone
+                await self.db.execute(
+                    update(BookingRequest.__table__)
+                    .where(
+                        BookingRequest.__table__.c.id == bindparam("booking_pk"),
+                        BookingRequest.__table__.c.request_status == "Pending",
+                    )
+                    .values(
+                        vehicle_id=bindparam("proposed_vehicle_id"),
+                        driver_id=bindparam("proposed_driver_id"),
+                        **{
+                            column: bindparam(f"proposed_{column}")
+                            for column in PRICE_COLUMNS.values()
+                        },
+                    ),
+                    proposals,
+                )
+                await self.db.commit()
+
+            return {
+                "pending_bookings": len(bookings),
+                "assigned": len(proposals),
+                "unassigned": len(bookings) - len(proposals),
+                "solve_seconds": round(solved_at - solve_started_at, 3),
+                "total_seconds": round(time.perf_counter() - started_at, 3),
+            }
+
+        except Exception as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error assigning bookings: {str(e)}",
+            )
+
+
+async def run_periodic_assignment(cache: RedisCache):
+    """
+    Assign pending bookings every ASSIGNMENT_INTERVAL_SECONDS (0, the
+    default, turns this off). A Redis lock lets one worker run per interval.
+    """
+    interval = float(os.getenv("ASSIGNMENT_INTERVAL_SECONDS", 0))
+    if interval <= 0:
+        return
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await cache.set_if_absent(
+                ASSIGNMENT_LOCK_KEY, "locked", max(int(interval), 1)
+            ):
+                async with SessionLocal() as session:
+                    summary = await AssignmentController(
+                        session
+                    ).assign_pending_bookings()
+                print(f"Assigned pending bookings: {summary}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error assigning pending bookings: {e}")
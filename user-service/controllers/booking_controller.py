@@ -2,10 +2,62 @@ import uuid
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from models.models import BookingRequest
-from models.schema import BookingRequestCreate
+from models.schema import BookingRequestCreate, BookingQuoteRequest
 from sqlalchemy.future import select
-from models.models import Users, Driver, Vehicle
+from sqlalchemy import insert, update, literal
+import os
+from dotenv import load_dotenv
+from config.cache import RedisCache, BOOKING_UPDATES_CHANNEL
+from models.models import Users, Driver, Vehicle, ORDER_STATUSES
 from utils.helpers import LogisticsCalculations
+from utils.geocode_cache import geocode_cache
+from utils.detour_model import detour_model
+from utils.pagination import (
+    newest_bookings_first,
+    booking_page_query,
+    booking_page,
+)
+from utils.token import (
+    create_quote_token,
+    decode_quote_token,
+    QUOTE_TOKEN_EXPIRE_SECONDS,
+)
+
+load_dotenv()
+
+cache = RedisCache()
+
+BOOKING_PAGE_SIZE = int(os.getenv("BOOKING_PAGE_SIZE", 50))
+BOOKING_MAX_PAGE_SIZE = int(os.getenv("BOOKING_MAX_PAGE_SIZE", 200))
+
+QUOTE_FIELDS = (
+    "total_distance_km",
+    "base_price",
+    "gst",
+    "platform_fee",
+    "total_price",
+    "estimated_delivery_time",
+    "pickup_coordinates",
+    "drop_coordinates",
+    "estimated",
+)
+
+
+def format_user_booking(booking):
+    return {
+        "pickup_location": booking.pickup_location,
+        "drop_location": booking.drop_location,
+        "distance_to_cover": booking.distance_to_cover,
+        "estimated_delivery_time": booking.estimated_delivery_time,
+        "total_price": booking.total_price,
+        "request_status": booking.request_status,
+        "delivery_status": booking.delivery_status,
+        "driver_details": {
+            "name": booking.driver_name,
+            "email": booking.driver_email,
+            "mobile": booking.driver_mobile,
+        },
+    }
 
 
 class BookingsController:
@@ -15,10 +67,10 @@ class BookingsController:
 
     async def get_coordinates(self, pickup_address, drop_address):
         try:
-            pickup_coordinates = self.logistic_calculator.geocode_address(
-                pickup_address
+            pickup_coordinates, drop_coordinates = await geocode_cache.geocode_many(
+                [pickup_address, drop_address],
+                self.logistic_calculator.geocode_address,
             )
-            drop_coordinates = self.logistic_calculator.geocode_address(drop_address)
 
             if pickup_coordinates != None and drop_coordinates != None:
                 return {
@@ -36,69 +88,186 @@ class BookingsController:
                 detail=f"Error creating booking: {str(e)}",
             )
 
-    async def create_booking(self, booking_data: BookingRequestCreate):
-        try:
-            user_query = select(Users).filter(Users.userid == booking_data.user_id)
-            user_result = await self.db.execute(user_query)
-            user = user_result.scalar_one_or_none()
-            if not user:
-                raise HTTPException(status_code=404, detail="User not found")
+    async def price_trip(self, vehicle, pickup_location: str, drop_location: str):
+        pickup_coordinates, drop_coordinates = await geocode_cache.geocode_many(
+            [pickup_location, drop_location],
+            self.logistic_calculator.geocode_address,
+        )
+        if pickup_coordinates is None or drop_coordinates is None:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Not able to find coordinates",
+            )
 
-            driver_query = select(Driver).filter(
-                Driver.driverid == booking_data.driver_id
+        calculation_results = (
+            await self.logistic_calculator.calculate_distance_time_price(
+                vehicle_lat=vehicle.current_latitude,
+                vehicle_lng=vehicle.current_longitude,
+                origin_address=pickup_location,
+                destination_address=drop_location,
+                fuel_type=vehicle.fuel_type,
+                origin_coordinates=pickup_coordinates,
+                destination_coordinates=drop_coordinates,
+                fallback=detour_model.estimate_leg,
             )
-            driver_result = await self.db.execute(driver_query)
-            driver = driver_result.scalar_one_or_none()
-            if not driver:
-                raise HTTPException(status_code=404, detail="Driver not found")
+        )
 
-            vehicle_query = select(Vehicle).filter(
-                Vehicle.vehicleid == booking_data.vehicle_id
+        if calculation_results is None:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Unable to create bookings",
             )
+        return calculation_results
+
+    def quote_from_token(self, booking_data: BookingRequestCreate):
+        """
+        Pricing carried by the booking's quote token, or None when there is
+        no token, it has expired, or it was issued for another trip.
+        """
+        if not booking_data.quote_token:
+            return None
+
+        quote = decode_quote_token(booking_data.quote_token)
+        if quote is None or any(
+            quote.get(field) != getattr(booking_data, field)
+            for field in ("user_id", "vehicle_id", "pickup_location", "drop_location")
+        ):
+            return None
+        return {field: quote[field] for field in QUOTE_FIELDS}
+
+    async def quote_booking(self, quote_data: BookingQuoteRequest):
+        """
+        Price a trip once and sign the result. Passing the token to
+        create_booking within QUOTE_TOKEN_EXPIRE_SECONDS books it at this
+        price without any maps calls.
+        """
+        try:
+            vehicle_query = select(
+                Vehicle.current_latitude, Vehicle.current_longitude, Vehicle.fuel_type
+            ).filter(Vehicle.vehicleid == quote_data.vehicle_id)
             vehicle_result = await self.db.execute(vehicle_query)
-            vehicle = vehicle_result.scalar_one_or_none()
+            vehicle = vehicle_result.first()
             if not vehicle:
                 raise HTTPException(status_code=404, detail="Vehicle not found")
 
-            calculation_results = (
-                self.logistic_calculator.calculate_distance_time_price(
-                    vehicle_lat=vehicle.current_latitude,
-                    vehicle_lng=vehicle.current_longitude,
-                    origin_address=booking_data.pickup_location,
-                    destination_address=booking_data.drop_location,
-                    fuel_type=vehicle.fuel_type,
-                )
+            calculation_results = await self.price_trip(
+                vehicle, quote_data.pickup_location, quote_data.drop_location
+            )
+            quote = {
+                "user_id": quote_data.user_id,
+                "vehicle_id": quote_data.vehicle_id,
+                "pickup_location": quote_data.pickup_location,
+                "drop_location": quote_data.drop_location,
+                **{field: calculation_results[field] for field in QUOTE_FIELDS},
+            }
+
+            return {
+                "quote": quote,
+                "quote_token": create_quote_token(quote),
+                "expires_in_seconds": QUOTE_TOKEN_EXPIRE_SECONDS,
+            }
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error quoting booking: {str(e)}",
+            )
+
+    async def booking_parties(self, booking_data: BookingRequestCreate):
+        """
+        Check the booking's user, driver and vehicle in one query: one row
+        whose columns are NULL for whichever of them does not exist.
+        Returns the vehicle's pricing columns.
+        """
+        ids = select(
+            literal(booking_data.user_id).label("user_id"),
+            literal(booking_data.driver_id).label("driver_id"),
+            literal(booking_data.vehicle_id).label("vehicle_id"),
+        ).subquery("ids")
+        parties_query = (
+            select(
+                Users.userid,
+                Driver.driverid,
+                Driver.availability,
+                Vehicle.vehicleid,
+                Vehicle.is_available,
+                Vehicle.active_status,
+                Vehicle.current_latitude,
+                Vehicle.current_longitude,
+                Vehicle.fuel_type,
+            )
+            .select_from(ids)
+            .outerjoin(Users, Users.userid == ids.c.user_id)
+            .outerjoin(Driver, Driver.driverid == ids.c.driver_id)
+            .outerjoin(Vehicle, Vehicle.vehicleid == ids.c.vehicle_id)
+        )
+        parties = (await self.db.execute(parties_query)).one()
+
+        if parties.userid is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        if parties.driverid is None:
+            raise HTTPException(status_code=404, detail="Driver not found")
+        if parties.vehicleid is None:
+            raise HTTPException(status_code=404, detail="Vehicle not found")
+        if not parties.availability:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT, detail="Driver is not available"
+            )
+        if not (parties.is_available and parties.active_status):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Vehicle is not available",
             )
+        return parties
 
+    async def create_booking(self, booking_data: BookingRequestCreate):
+        try:
+            vehicle = await self.booking_parties(booking_data)
+
+            calculation_results = self.quote_from_token(booking_data)
             if calculation_results is None:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Unable to create bookings",
+                calculation_results = await self.price_trip(
+                    vehicle, booking_data.pickup_location, booking_data.drop_location
                 )
 
-            new_booking = BookingRequest(
-                booking_id=str(uuid.uuid4()),
-                user_id=booking_data.user_id,
-                vehicle_id=booking_data.vehicle_id,
-                driver_id=booking_data.driver_id,
-                pickup_location=booking_data.pickup_location,
-                pickup_latitude=calculation_results["pickup_coordinates"][0],
-                pickup_longitude=calculation_results["pickup_coordinates"][1],
-                drop_location=booking_data.drop_location,
-                drop_latitude=calculation_results["drop_coordinates"][0],
-                drop_longitude=calculation_results["drop_coordinates"][1],
-                distance_to_cover=float(calculation_results["total_distance_km"]),
-                estimated_delivery_time=calculation_results["estimated_delivery_time"],
-                base_price=calculation_results["base_price"],
-                gst=calculation_results["gst"],
-                platform_fee=calculation_results["platform_fee"],
-                total_price=calculation_results["total_price"],
+            insert_query = (
+                insert(BookingRequest)
+                .values(
+                    booking_id=str(uuid.uuid4()),
+                    user_id=booking_data.user_id,
+                    vehicle_id=booking_data.vehicle_id,
+                    driver_id=booking_data.driver_id,
+                    pickup_location=booking_data.pickup_location,
+                    pickup_latitude=calculation_results["pickup_coordinates"][0],
+                    pickup_longitude=calculation_results["pickup_coordinates"][1],
+                    drop_location=booking_data.drop_location,
+                    drop_latitude=calculation_results["drop_coordinates"][0],
+                    drop_longitude=calculation_results["drop_coordinates"][1],
+                    distance_to_cover=float(calculation_results["total_distance_km"]),
+                    estimated_delivery_time=calculation_results[
+                        "estimated_delivery_time"
+                    ],
+                    base_price=calculation_results["base_price"],
+                    gst=calculation_results["gst"],
+                    platform_fee=calculation_results["platform_fee"],
+                    total_price=calculation_results["total_price"],
+                )
+                .returning(
+                    BookingRequest.booking_id,
+                    BookingRequest.pickup_location,
+                    BookingRequest.drop_location,
+                    BookingRequest.distance_to_cover,
+                    BookingRequest.estimated_delivery_time,
+                    BookingRequest.base_price,
+                    BookingRequest.gst,
+                    BookingRequest.platform_fee,
+                    BookingRequest.total_price,
+                )
             )
-
-            self.db.add(new_booking)
+            new_booking = (await self.db.execute(insert_query)).first()
             await self.db.commit()
 
-            await self.db.refresh(new_booking)
             response_dict = {
                 "message": "Booking has been successfully created",
                 "details": {
@@ -111,10 +280,14 @@ class BookingsController:
                     "gst": new_booking.gst,
                     "platform_fee": new_booking.platform_fee,
                     "total_price": new_booking.total_price,
+                    "quote_estimated": calculation_results["estimated"],
                 },
             }
 
             return response_dict
+        except HTTPException:
+            await self.db.rollback()
+            raise
         except Exception as e:
             await self.db.rollback()
             raise HTTPException(
@@ -122,7 +295,174 @@ class BookingsController:
                 detail=f"Error creating booking: {str(e)}",
             )
 
-    async def get_user_bookings(self, user_id: str):
+    async def create_pricing_booking(self, booking_data: BookingRequestCreate):
+        """
+        Async booking mode: validate the booking and store it in the
+        "Pricing" state. price_booking fills in the price later, outside the
+        request.
+        """
+        try:
+            await self.booking_parties(booking_data)
+
+            insert_query = (
+                insert(BookingRequest)
+                .values(
+                    booking_id=str(uuid.uuid4()),
+                    user_id=booking_data.user_id,
+                    vehicle_id=booking_data.vehicle_id,
+                    driver_id=booking_data.driver_id,
+                    pickup_location=booking_data.pickup_location,
+                    drop_location=booking_data.drop_location,
+                    request_status="Pricing",
+                )
+                .returning(BookingRequest.booking_id)
+            )
+            booking_id = (await self.db.execute(insert_query)).scalar_one()
+            await self.db.commit()
+
+            return {
+                "message": "Booking has been accepted and is being priced",
+                "booking_id": booking_id,
+                "request_status": "Pricing",
+                "status_url": f"/booking/status?booking_id={booking_id}",
+            }
+        except HTTPException:
+            await self.db.rollback()
+            raise
+        except Exception as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error creating booking: {str(e)}",
+            )
+
+    async def price_booking(self, booking_id: str):
+        """
+        Price a booking left in the "Pricing" state and move it to
+        "Pending". Bookings already priced are skipped, so a retried task
+        does no harm.
+        """
+        pricing_query = (
+            select(
+                BookingRequest.pickup_location,
+                BookingRequest.drop_location,
+                Vehicle.current_latitude,
+                Vehicle.current_longitude,
+                Vehicle.fuel_type,
+            )
+            .join(Vehicle, BookingRequest.vehicle_id == Vehicle.vehicleid)
+            .filter(
+                BookingRequest.booking_id == booking_id,
+                BookingRequest.request_status == "Pricing",
+            )
+        )
+        booking = (await self.db.execute(pricing_query)).first()
+        if not booking:
+            return None
+
+        calculation_results = await self.price_trip(
+            booking, booking.pickup_location, booking.drop_location
+        )
+        await self.db.execute(
+            update(BookingRequest)
+            .where(
+                BookingRequest.booking_id == booking_id,
+                BookingRequest.request_status == "Pricing",
+            )
+            .values(
+                pickup_latitude=calculation_results["pickup_coordinates"][0],
+                pickup_longitude=calculation_results["pickup_coordinates"][1],
+                drop_latitude=calculation_results["drop_coordinates"][0],
+                drop_longitude=calculation_results["drop_coordinates"][1],
+                distance_to_cover=float(calculation_results["total_distance_km"]),
+                estimated_delivery_time=calculation_results["estimated_delivery_time"],
+                base_price=calculation_results["base_price"],
+                gst=calculation_results["gst"],
+                platform_fee=calculation_results["platform_fee"],
+                total_price=calculation_results["total_price"],
+                request_status="Pending",
+            )
+        )
+        await self.db.commit()
+        await cache.publish(
+            BOOKING_UPDATES_CHANNEL,
+            {"booking_id": booking_id, "request_status": "Pending"},
+        )
+        return calculation_results
+
+    async def fail_pricing(self, booking_id: str):
+        await self.db.execute(
+            update(BookingRequest)
+            .where(
+                BookingRequest.booking_id == booking_id,
+                BookingRequest.request_status == "Pricing",
+            )
+            .values(request_status="Failed")
+        )
+        await self.db.commit()
+        await cache.publish(
+            BOOKING_UPDATES_CHANNEL,
+            {"booking_id": booking_id, "request_status": "Failed"},
+        )
+
+    async def get_booking_status(self, booking_id: str, user_id: str):
+        try:
+            status_query = select(
+                BookingRequest.booking_id,
+                BookingRequest.request_status,
+                BookingRequest.delivery_status,
+                BookingRequest.pickup_location,
+                BookingRequest.drop_location,
+                BookingRequest.distance_to_cover,
+                BookingRequest.estimated_delivery_time,
+                BookingRequest.base_price,
+                BookingRequest.gst,
+                BookingRequest.platform_fee,
+                BookingRequest.total_price,
+            ).filter(
+                BookingRequest.booking_id == booking_id,
+                BookingRequest.user_id == user_id,
+            )
+            booking = (await self.db.execute(status_query)).first()
+            if not booking:
+                raise HTTPException(status_code=404, detail="Booking not found")
+
+            return {
+                "booking_id": booking.booking_id,
+                "request_status": booking.request_status,
+                "delivery_status": booking.delivery_status,
+                "details": (
+                    None
+                    if booking.request_status in ("Pricing", "Failed")
+                    else {
+                        "pickup_location": booking.pickup_location,
+                        "drop_location": booking.drop_location,
+                        "total_distance": booking.distance_to_cover,
+                        "estimated_delivery_time": booking.estimated_delivery_time,
+                        "base_price": booking.base_price,
+                        "gst": booking.gst,
+                        "platform_fee": booking.platform_fee,
+                        "total_price": booking.total_price,
+                    }
+                ),
+            }
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error fetching booking status: {str(e)}",
+            )
+
+    async def get_user_bookings(
+        self, user_id: str, page_size: int = None, after: tuple = None
+    ):
+        """
+        One page of the user's bookings, newest first, with the cursor of
+        the next page. after is the (created_at, id) decoded from the
+        previous page's cursor.
+        """
+        page_size = min(page_size or BOOKING_PAGE_SIZE, BOOKING_MAX_PAGE_SIZE)
         try:
             user_query = select(Users).filter(Users.userid == user_id)
             result = await self.db.execute(user_query)
@@ -133,54 +473,44 @@ class BookingsController:
                     detail="User not found",
                 )
 
-            booking_query = (
-                select(
-                    BookingRequest.pickup_location,
-                    BookingRequest.drop_location,
-                    BookingRequest.distance_to_cover,
-                    BookingRequest.estimated_delivery_time,
-                    BookingRequest.total_price,
-                    BookingRequest.request_status,
-                    BookingRequest.delivery_status,
-                    Driver.name.label("driver_name"),
-                    Driver.email.label("driver_email"),
-                    Driver.mobile.label("driver_mobile"),
-                )
-                .join(Driver, BookingRequest.driver_id == Driver.driverid)
-                .filter(BookingRequest.user_id == user_id)
+            result = await self.db.execute(
+                booking_page_query(self.user_bookings_query(user_id), after, page_size)
             )
+            bookings, next_cursor = booking_page(result.fetchall(), page_size)
 
-            result = await self.db.execute(booking_query)
-            bookings = result.fetchall()
-
-            if not bookings:
+            if not bookings and after is None:
                 raise HTTPException(status_code=404, detail="No bookings found")
 
-            formatted_bookings = []
-            for booking in bookings:
-                formatted_booking = {
-                    "pickup_location": booking.pickup_location,
-                    "drop_location": booking.drop_location,
-                    "distance_to_cover": booking.distance_to_cover,
-                    "estimated_delivery_time": booking.estimated_delivery_time,
-                    "total_price": booking.total_price,
-                    "request_status": booking.request_status,
-                    "delivery_status": booking.delivery_status,
-                    "driver_details": {
-                        "name": booking.driver_name,
-                        "email": booking.driver_email,
-                        "mobile": booking.driver_mobile,
-                    },
-                }
-                formatted_bookings.append(formatted_booking)
-
-            return formatted_bookings
+            return {
+                "bookings": [format_user_booking(booking) for booking in bookings],
+                "next_cursor": next_cursor,
+            }
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error fetching user bookings: {str(e)}",
             )
 
+    def user_bookings_query(self, user_id: str):
+        return newest_bookings_first(
+            select(
+                BookingRequest.id,
+                BookingRequest.created_at,
+                BookingRequest.pickup_location,
+                BookingRequest.drop_location,
+                BookingRequest.distance_to_cover,
+                BookingRequest.estimated_delivery_time,
+                BookingRequest.total_price,
+                BookingRequest.request_status,
+                BookingRequest.delivery_status,
+                Driver.name.label("driver_name"),
+                Driver.email.label("driver_email"),
+                Driver.mobile.label("driver_mobile"),
+            )
+            .join(Driver, BookingRequest.driver_id == Driver.driverid)
+            .filter(BookingRequest.user_id == user_id)
+        )
+
     async def update_order_status(self, booking_id: str, new_status: str):
         try:
             booking_query = select(BookingRequest).filter(
@@ -192,6 +522,9 @@ class BookingsController:
             if not booking:
                 raise HTTPException(status_code=404, detail="Booking not found")
 
+            if new_status not in ORDER_STATUSES:
+                raise HTTPException(status_code=400, detail="Invalid order status")
+
             if (
                 booking.request_status != "Accepted"
                 or booking.delivery_status != "Delivered"
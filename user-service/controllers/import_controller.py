@@ -0,0 +1,276 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from models.models import Users, Driver, Vehicle
+from utils.helpers import LogisticsCalculations
+from utils.geocode_cache import geocode_cache
+from utils.detour_model import detour_model
+import csv
+import io
+import json
+import os
+import uuid
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+IMPORT_FIELDS = ("vehicle_id", "driver_id", "pickup_location", "drop_location")
+
+COPY_COLUMNS = (
+    "booking_id",
+    "user_id",
+    "vehicle_id",
+    "driver_id",
+    "pickup_location",
+    "pickup_latitude",
+    "pickup_longitude",
+    "drop_location",
+    "drop_latitude",
+    "drop_longitude",
+    "distance_to_cover",
+    "estimated_delivery_time",
+    "base_price",
+    "gst",
+    "platform_fee",
+    "total_price",
+    "request_status",
+    "delivery_status",
+    "order_status",
+    "payment_status",
+)
+
+
+class BookingImportController:
+    """
+    Bulk creation of a user's bookings from a CSV or NDJSON upload.
+
+    - Each distinct address is geocoded once, through the geocode cache
+    - Every row is priced in one vectorized pass on straight-line distances
+      scaled by the learned detour factors, so an import makes no
+      distance matrix calls and its prices are estimates
+    - Valid rows are written with a single COPY; invalid rows are skipped
+      and reported with their row number
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.logistic_calculator = LogisticsCalculations()
+        self.max_rows = int(os.getenv("IMPORT_MAX_ROWS", 10000))
+        self.geocode_concurrency = int(os.getenv("IMPORT_GEOCODE_CONCURRENCY", 20))
+
+    def parse_rows(self, body: str, format: str):
+        """
+        (row number, fields or None, error) for each non-blank row.
+        """
+        if format == "csv":
+            reader = csv.DictReader(io.StringIO(body))
+            for row_number, row in enumerate(reader, start=1):
+                yield row_number, row, None
+            return
+
+        for row_number, line in enumerate(body.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield row_number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield row_number, None, "Row is not a JSON object"
+                continue
+            yield row_number, row, None
+
+    def validate_rows(self, body: str, format: str):
+        rows, errors = [], []
+        for row_number, row, error in self.parse_rows(body, format):
+            if error is None:
+                values = {
+                    field: str(row.get(field) or "").strip() for field in IMPORT_FIELDS
+                }
+                missing = [field for field, value in values.items() if not value]
+                if missing:
+                    error = f"Missing {', '.join(missing)}"
+            if error is not None:
+                errors.append({"row": row_number, "status": "error", "error": error})
+                continue
+            rows.append({"row": row_number, **values})
+
+        if len(rows) + len(errors) > self.max_rows:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"An import is limited to {self.max_rows} rows",
+            )
+        return rows, errors
+
+    async def import_parties(self, user_id: str, rows):
+        """
+        The user, and the vehicles and drivers named by the rows, looked up
+        with one query each.
+        """
+        user = (
+            await self.db.execute(select(Users.userid).filter(Users.userid == user_id))
+        ).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        vehicles_query = select(
+            Vehicle.vehicleid,
+            Vehicle.is_available,
+            Vehicle.active_status,
+            Vehicle.current_latitude,
+            Vehicle.current_longitude,
+            Vehicle.fuel_type,
+        ).filter(Vehicle.vehicleid.in_({row["vehicle_id"] for row in rows}))
+        vehicles = {
+            vehicle.vehicleid: vehicle
+            for vehicle in (await self.db.execute(vehicles_query)).all()
+        }
+        drivers_query = select(Driver.driverid, Driver.availability).filter(
+            Driver.driverid.in_({row["driver_id"] for row in rows})
+        )
+        drivers = dict((await self.db.execute(drivers_query)).all())
+        return vehicles, drivers
+
+    async def import_bookings(self, user_id: str, body: str, format: str):
+        try:
+            rows, report = self.validate_rows(body, format)
+            if not rows:
+                return self.summary(report)
+
+            vehicles, drivers = await self.import_parties(user_id, rows)
+
+            addresses = list(
+                {
+                    row[field]
+                    for row in rows
+                    for field in ("pickup_location", "drop_location")
+                }
+            )
+            coordinates = dict(
+                zip(
+                    addresses,
+                    await geocode_cache.geocode_many(
+                        addresses,
+                        self.logistic_calculator.geocode_address,
+                        concurrency=self.geocode_concurrency,
+                    ),
+                )
+            )
+
+            priced_rows = []
+            for row in rows:
+                # Same checks and messages as booking_parties in /booking/new
+                vehicle = vehicles.get(row["vehicle_id"])
+                if row["driver_id"] not in drivers:
+                    error = "Driver not found"
+                elif vehicle is None:
+                    error = "Vehicle not found"
+                elif not drivers[row["driver_id"]]:
+                    error = "Driver is not available"
+                elif not (vehicle.is_available and vehicle.active_status):
+                    error = "Vehicle is not available"
+                elif vehicle.current_latitude is None:
+                    error = "Vehicle has no known location"
+                elif coordinates[row["pickup_location"]] is None:
+                    error = "Not able to find pickup coordinates"
+                elif coordinates[row["drop_location"]] is None:
+                    error = "Not able to find drop coordinates"
+                else:
+                    priced_rows.append(row)
+                    continue
+                report.append({"row": row["row"], "status": "error", "error": error})
+
+            if priced_rows:
+                report.extend(
+                    await self.insert_bookings(
+                        user_id, priced_rows, vehicles, coordinates
+                    )
+                )
+            return self.summary(report)
+        except HTTPException:
+            await self.db.rollback()
+            raise
+        except Exception as e:
+            await self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error importing bookings: {str(e)}",
+            )
+
+    async def insert_bookings(self, user_id: str, rows, vehicles, coordinates):
+        trip_vehicles = [vehicles[row["vehicle_id"]] for row in rows]
+        pickups = np.array(
+            [coordinates[row["pickup_location"]] for row in rows], dtype=np.float64
+        )
+        drops = np.array(
+            [coordinates[row["drop_location"]] for row in rows], dtype=np.float64
+        )
+        prices = self.logistic_calculator.calculate_estimated_prices(
+            np.array([vehicle.current_latitude for vehicle in trip_vehicles]),
+            np.array([vehicle.current_longitude for vehicle in trip_vehicles]),
+            pickups[:, 0],
+            pickups[:, 1],
+            drops[:, 0],
+            drops[:, 1],
+            [vehicle.fuel_type for vehicle in trip_vehicles],
+            detour_factors=detour_model.factors_for(pickups[:, 0], pickups[:, 1]),
+        )
+        delivery_hours = np.floor(prices["total_distance_km"] / detour_model.speed_kmph)
+
+        records, report = [], []
+        for index, row in enumerate(rows):
+            booking_id = str(uuid.uuid4())
+            total_price = float(prices["total_price"][index])
+            records.append(
+                (
+                    booking_id,
+                    user_id,
+                    row["vehicle_id"],
+                    row["driver_id"],
+                    row["pickup_location"],
+                    float(pickups[index, 0]),
+                    float(pickups[index, 1]),
+                    row["drop_location"],
+                    float(drops[index, 0]),
+                    float(drops[index, 1]),
+                    float(prices["total_distance_km"][index]),
+                    float(delivery_hours[index]),
+                    float(prices["base_price"][index]),
+                    float(prices["gst"][index]),
+                    float(prices["platform_fee"][index]),
+                    total_price,
+                    "Pending",
+                    "Pending Pickup",
+                    "Pending",
+                    "Completed",
+                )
+            )
+            report.append(
+                {
+                    "row": row["row"],
+                    "status": "created",
+                    "booking_id": booking_id,
+                    "total_price": total_price,
+                }
+            )
+
+        connection = await self.db.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            "booking_requests", records=records, columns=COPY_COLUMNS
+        )
+        await self.db.commit()
+        return report
+
+    def summary(self, report):
+        report.sort(key=lambda entry: entry["row"])
+        created = sum(1 for entry in report if entry["status"] == "created")
+        return {
+            "message": f"{created} of {len(report)} bookings imported",
+            "created": created,
+            "failed": len(report) - created,
+            "quote_estimated": True,
+            "rows": report,
+        }
@@ -3,82 +3,179 @@ from models.models import Vehicle
 from models.schema import VehicleSearch
 from fastapi import HTTPException, status
 from sqlalchemy import select
+from config.cache import RedisCache, VEHICLE_LOCATIONS_KEY, DRIVER_LOCATIONS_KEY
 from utils.helpers import LogisticsCalculations
-import asyncio
+from utils.driver_index import driver_index
+from utils.fleet_snapshot import fleet_snapshot
+from utils.pagination import encode_cursor
+from utils.search_cache import search_cache
+import heapq
+import numpy as np
+import os
+from dotenv import load_dotenv
 
+load_dotenv()
 
-from models.models import Driver
+cache = RedisCache()
 
 
 class VehicleController:
     def __init__(self, db: AsyncSession):
         self.db = db
-        self.radius = 50000
+        self.radius = float(os.getenv("SEARCH_RADIUS_KM", 100))
+        self.logistic_calculator = LogisticsCalculations()
+        self.search_limit = 20
+        # Deepest a search cursor may page, which bounds its candidate pool
+        self.max_served = int(os.getenv("SEARCH_MAX_SERVED", 1000))
+        # Vehicles pulled from the fleet snapshot before pricing
+        self.candidate_pool = 100
+        # "redis" reads positions from the shared geo index, "memory" from
+        # this worker's snapshot and driver index
+        self.location_index = os.getenv("LOCATION_INDEX", "redis")
+        # Geo searches cannot filter on capacity, so they fetch extra vehicles
+        self.geo_overfetch = int(os.getenv("LOCATION_INDEX_OVERFETCH", 4))
 
-    async def search_vehicle(self, search_params: VehicleSearch):
-        try:
-            vehicles_query = select(Vehicle).filter(
-                Vehicle.capacity_in_kg >= search_params.capacity_in_kg,
-                Vehicle.is_available == True,
-                Vehicle.active_status == True,
-            )
+    async def search_vehicle(self, search_params: VehicleSearch, cursor: dict = None):
+        """
+        Serve a page from the search cache, or compute and cache it. Searches
+        run on quantized parameters so that every request sharing a cache entry
+        gets the same answer.
+        """
+        search_params = search_cache.quantize(search_params)
+        cache_key = search_cache.key_for(
+            search_params, encode_cursor(cursor) if cursor else None
+        )
 
-            result = await self.db.execute(vehicles_query)
-            vehicles = result.scalars().all()
+        cached_result = await search_cache.get(cache_key)
+        if cached_result is not None:
+            return cached_result
 
-            logistic_calculator = LogisticsCalculations()
+        search_result = await self.find_vehicles(search_params, cursor)
 
-            async def calculate_distance_and_price(vehicle):
-                vehicle_latitude = float(vehicle.current_latitude)
-                vehicle_longitude = float(vehicle.current_longitude)
+        await search_cache.set(
+            cache_key, search_result, tags=self.cache_tags(search_params)
+        )
+        return search_result
 
-                distance = await asyncio.to_thread(
-                    logistic_calculator.calculate_estimated_distance,
-                    from_latitude=search_params.pickup_latitude,
-                    from_longitude=search_params.pickup_longitude,
-                    to_latitude=vehicle_latitude,
-                    to_longitude=vehicle_longitude,
-                )
+    async def search_vehicles_batch(self, queries: list):
+        """
+        First page of results for every query, in order. Identical quantized
+        queries are computed once and cache misses are priced together.
+        """
+        queries = [search_cache.quantize(search_params) for search_params in queries]
+        cache_keys = [search_cache.key_for(search_params) for search_params in queries]
+
+        results = {}
+        missing = {}
+        for cache_key, search_params in zip(cache_keys, queries):
+            if cache_key in results or cache_key in missing:
+                continue
+            cached_result = await search_cache.get(cache_key)
+            if cached_result is not None:
+                results[cache_key] = cached_result
+            else:
+                missing[cache_key] = search_params
 
-                estimated_price = logistic_calculator.calculate_estimated_price(
-                    vehicle_latitude,
-                    vehicle_longitude,
-                    search_params.pickup_latitude,
-                    search_params.pickup_longitude,
-                    search_params.drop_latitude,
-                    search_params.drop_longitude,
-                    vehicle.fuel_type,
+        if missing:
+            computed = await self.find_vehicles_batch(list(missing.values()))
+            for (cache_key, search_params), search_result in zip(
+                missing.items(), computed
+            ):
+                results[cache_key] = search_result
+                await search_cache.set(
+                    cache_key, search_result, tags=self.cache_tags(search_params)
                 )
 
-                return vehicle, distance, estimated_price
+        return [results[cache_key] for cache_key in cache_keys]
 
-            tasks = [calculate_distance_and_price(vehicle) for vehicle in vehicles]
-            results = await asyncio.gather(*tasks)
+    def cache_tags(self, search_params: VehicleSearch):
+        return search_cache.tags_for(
+            *self.logistic_calculator.calculate_bounding_box(
+                search_params.pickup_latitude,
+                search_params.pickup_longitude,
+                self.radius,
+            )
+        )
 
-            nearby_vehicles = []
-            for vehicle, distance, estimated_price in results:
-                if distance <= self.radius:
-                    nearby_vehicles.append(
-                        {
-                            "vehicle_id": vehicle.vehicleid,
-                            "registration_number": vehicle.registration_number,
-                            "model_name": vehicle.model_name,
-                            "capacity_in_kg": vehicle.capacity_in_kg,
-                            "current_latitude": vehicle.current_latitude,
-                            "current_longitude": vehicle.current_longitude,
-                            "fuel_type": vehicle.fuel_type,
-                            "distance_from_pickup": distance,
-                            "total_distance_km": estimated_price["total_distance_km"],
-                            "base_price": estimated_price["base_price"],
-                            "gst": estimated_price["gst"],
-                            "platform_fee": estimated_price["platform_fee"],
-                            "total_price": estimated_price["total_price"],
-                        }
+    async def candidates_for(self, queries: list, served: int = 0):
+        """
+        (snapshot positions, latitudes, longitudes) of the vehicles around
+        each query's pickup point. The shared geo index answers with live
+        positions in one round trip; the snapshot's own grid is used when it
+        is turned off, unreachable or not built yet.
+        """
+        needed = self.candidate_pool + served
+        count = needed * self.geo_overfetch
+        found = None
+        if self.location_index == "redis":
+            found = await cache.geo_search(
+                VEHICLE_LOCATIONS_KEY,
+                [
+                    (
+                        search_params.pickup_latitude,
+                        search_params.pickup_longitude,
+                        count,
                     )
+                    for search_params in queries
+                ],
+                self.radius,
+            )
+
+        if found is None:
+            return [
+                self.grid_candidates(search_params, needed) for search_params in queries
+            ]
+
+        candidate_sets = []
+        for search_params, locations in zip(queries, found):
+            candidates = fleet_snapshot.live_candidates(
+                locations, search_params.capacity_in_kg
+            )
+            # GEOSEARCH counts before the capacity filter, so a full answer
+            # that leaves too few vehicles may have cut eligible ones off;
+            # the grid filters on capacity before counting
+            if len(locations) >= count and len(candidates[0]) < needed:
+                candidates = self.grid_candidates(search_params, needed)
+            candidate_sets.append(candidates)
+        return candidate_sets
+
+    def grid_candidates(self, search_params: VehicleSearch, needed: int):
+        candidates = fleet_snapshot.candidates(
+            latitude=search_params.pickup_latitude,
+            longitude=search_params.pickup_longitude,
+            min_count=needed,
+            max_distance_km=self.radius,
+            min_capacity=search_params.capacity_in_kg,
+        )
+        return (
+            candidates,
+            fleet_snapshot.latitudes[candidates],
+            fleet_snapshot.longitudes[candidates],
+        )
+
+    async def find_vehicles(self, search_params: VehicleSearch, cursor: dict = None):
+        """
+        Cheapest vehicles first, one page at a time.
+        """
+        try:
+            await fleet_snapshot.ensure_fresh()
+            [(candidates, latitudes, longitudes)] = await self.candidates_for(
+                [search_params], served=cursor["served"] if cursor else 0
+            )
 
-            nearby_vehicles.sort(key=lambda x: x["total_price"])
+            estimated_prices = self.logistic_calculator.calculate_estimated_prices(
+                latitudes,
+                longitudes,
+                search_params.pickup_latitude,
+                search_params.pickup_longitude,
+                search_params.drop_latitude,
+                search_params.drop_longitude,
+                fleet_snapshot.fuel_types[candidates],
+            )
 
-            return nearby_vehicles[:20]
+            return self.select_page(
+                candidates, latitudes, longitudes, estimated_prices, cursor
+            )
 
         except Exception as e:
             raise HTTPException(
@@ -86,59 +183,168 @@ class VehicleController:
                 detail=f"Error fetching vehicles: {str(e)}",
             )
 
-    async def suggest_nearest_driver(self, vehicle_id: str):
+    async def find_vehicles_batch(self, queries: list):
+        """
+        First page for many searches from one snapshot read and one
+        vectorized pricing pass over all of their candidates.
+        """
         try:
-            vehicle_query = select(Vehicle).filter(Vehicle.vehicleid == vehicle_id)
-            result = await self.db.execute(vehicle_query)
-            vehicle = result.scalar()
+            await fleet_snapshot.ensure_fresh()
+            candidate_sets = await self.candidates_for(queries)
+            counts = [len(candidates) for candidates, _, _ in candidate_sets]
+            all_candidates = np.concatenate(
+                [candidates for candidates, _, _ in candidate_sets]
+            ).astype(np.int64)
 
-            if not vehicle:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND, detail="Vehicle not found"
+            def per_candidate(attribute):
+                return np.repeat(
+                    [getattr(search_params, attribute) for search_params in queries],
+                    counts,
                 )
 
-            drivers_query = select(Driver).filter(Driver.availability == True)
+            estimated_prices = self.logistic_calculator.calculate_estimated_prices(
+                np.concatenate([latitudes for _, latitudes, _ in candidate_sets]),
+                np.concatenate([longitudes for _, _, longitudes in candidate_sets]),
+                per_candidate("pickup_latitude"),
+                per_candidate("pickup_longitude"),
+                per_candidate("drop_latitude"),
+                per_candidate("drop_longitude"),
+                fleet_snapshot.fuel_types[all_candidates],
+            )
+
+            search_results = []
+            start = 0
+            for (candidates, latitudes, longitudes), count in zip(
+                candidate_sets, counts
+            ):
+                window = slice(start, start + count)
+                search_results.append(
+                    self.select_page(
+                        candidates,
+                        latitudes,
+                        longitudes,
+                        {
+                            key: values[window]
+                            for key, values in estimated_prices.items()
+                        },
+                    )
+                )
+                start += count
+
+            return search_results
+
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error fetching vehicles: {str(e)}",
+            )
 
-            result = await self.db.execute(drivers_query)
-            drivers = result.scalars().all()
+    def select_page(
+        self,
+        candidates,
+        latitudes,
+        longitudes,
+        estimated_prices: dict,
+        cursor: dict = None,
+    ):
+        """
+        Keep the cheapest page of priced candidates. The returned next_cursor
+        holds the (total_price, vehicle_id) of the last vehicle on the page.
+        """
+        served = cursor["served"] if cursor else 0
+        vehicle_ids = fleet_snapshot.vehicle_ids[candidates].tolist()
+        estimated_prices = {
+            key: values.tolist() for key, values in estimated_prices.items()
+        }
+        distances = estimated_prices["distance_from_pickup"]
+        total_prices = estimated_prices["total_price"]
 
-            logistic_calculator = LogisticsCalculations()
+        def sort_key(position):
+            return total_prices[position], vehicle_ids[position]
 
-            async def calculate_driver_distance(driver):
-                driver_latitude = float(driver.current_latitude)
-                driver_longitude = float(driver.current_longitude)
+        after = (cursor["total_price"], cursor["vehicle_id"]) if cursor else None
+        eligible = (
+            position
+            for position in range(len(candidates))
+            if distances[position] <= self.radius
+            and (after is None or sort_key(position) > after)
+        )
 
-                distance = await asyncio.to_thread(
-                    logistic_calculator.calculate_estimated_distance,
-                    from_latitude=vehicle.current_latitude,
-                    from_longitude=vehicle.current_longitude,
-                    to_latitude=driver_latitude,
-                    to_longitude=driver_longitude,
-                )
+        # Bounded heap: one extra entry tells whether another page exists
+        best = heapq.nsmallest(self.search_limit + 1, eligible, key=sort_key)
+        page = best[: self.search_limit]
+
+        nearby_vehicles = []
+        for position in page:
+            row = candidates[position]
+            nearby_vehicles.append(
+                {
+                    "vehicle_id": vehicle_ids[position],
+                    "registration_number": fleet_snapshot.registration_numbers[row],
+                    "model_name": fleet_snapshot.model_names[row],
+                    "capacity_in_kg": float(fleet_snapshot.capacities[row]),
+                    "current_latitude": float(latitudes[position]),
+                    "current_longitude": float(longitudes[position]),
+                    "fuel_type": fleet_snapshot.fuel_types[row],
+                    "distance_from_pickup": distances[position],
+                    "total_distance_km": estimated_prices["total_distance_km"][
+                        position
+                    ],
+                    "base_price": estimated_prices["base_price"][position],
+                    "gst": estimated_prices["gst"][position],
+                    "platform_fee": estimated_prices["platform_fee"][position],
+                    "total_price": total_prices[position],
+                }
+            )
 
-                return driver, distance
+        next_cursor = None
+        if len(best) > self.search_limit:
+            last = nearby_vehicles[-1]
+            next_cursor = encode_cursor(
+                {
+                    "total_price": last["total_price"],
+                    "vehicle_id": last["vehicle_id"],
+                    "served": served + len(nearby_vehicles),
+                }
+            )
 
-            tasks = [calculate_driver_distance(driver) for driver in drivers]
-            results = await asyncio.gather(*tasks)
+        return {"vehicles": nearby_vehicles, "next_cursor": next_cursor}
 
-            nearby_drivers = []
-            for driver, distance in results:
-                if distance <= self.radius:
-                    nearby_drivers.append(
-                        {
-                            "driver_id": driver.driverid,
-                            "name": driver.name,
-                            "email": driver.email,
-                            "mobile": driver.mobile,
-                            "current_latitude": driver.current_latitude,
-                            "current_longitude": driver.current_longitude,
-                            "distance_from_vehicle": distance,
-                        }
-                    )
+    async def suggest_nearest_drivers(self, vehicle_id: str, k: int = 1):
+        try:
+            vehicle_query = select(
+                Vehicle.current_latitude, Vehicle.current_longitude
+            ).filter(Vehicle.vehicleid == vehicle_id)
+            result = await self.db.execute(vehicle_query)
+            vehicle = result.first()
+
+            if not vehicle:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND, detail="Vehicle not found"
+                )
 
-            nearby_drivers.sort(key=lambda x: x["distance_from_vehicle"])
+            await driver_index.ensure_fresh()
+            positions, latitudes, longitudes, distances = await self.nearest_drivers(
+                vehicle.current_latitude, vehicle.current_longitude, k
+            )
 
-            return nearby_drivers[0]
+            return [
+                {
+                    "driver_id": driver_index.driver_ids[position],
+                    "name": driver_index.names[position],
+                    "email": driver_index.emails[position],
+                    "mobile": driver_index.mobiles[position],
+                    "current_latitude": latitude,
+                    "current_longitude": longitude,
+                    "distance_from_vehicle": distance,
+                }
+                for position, latitude, longitude, distance in zip(
+                    positions.tolist(),
+                    latitudes.tolist(),
+                    longitudes.tolist(),
+                    distances.tolist(),
+                )
+            ]
 
         except Exception as e:
             raise HTTPException(
@@ -146,5 +352,40 @@ class VehicleController:
                 detail=f"Error fetching drivers: {str(e)}",
             )
 
+    async def nearest_drivers(self, latitude, longitude, k: int):
+        """
+        (driver index positions, latitudes, longitudes, distances) of the k
+        nearest available drivers, from the shared geo index when possible.
+        """
+        found = None
+        if self.location_index == "redis":
+            found = await cache.geo_search(
+                DRIVER_LOCATIONS_KEY,
+                [(latitude, longitude, k * self.geo_overfetch)],
+                self.radius,
+            )
+
+        if found is None:
+            positions, distances = driver_index.nearest(
+                latitude, longitude, k, self.radius
+            )
+            return (
+                positions,
+                driver_index.latitudes[positions],
+                driver_index.longitudes[positions],
+                distances,
+            )
+
+        positions, latitudes, longitudes = driver_index.live_drivers(found[0])
+        positions, latitudes, longitudes = positions[:k], latitudes[:k], longitudes[:k]
+        distances = self.logistic_calculator.calculate_estimated_distances(
+            latitude, longitude, latitudes, longitudes
+        )
+        return positions, latitudes, longitudes, distances
+
+    async def suggest_nearest_driver(self, vehicle_id: str):
+        nearby_drivers = await self.suggest_nearest_drivers(vehicle_id, k=1)
+        return nearby_drivers[0]
+
     def __del__(self):
         pass
@@ -5,10 +5,15 @@ from routes.user_route import user_router
 from routes.vehicle_route import vehicle_router
 from routes.booking_route import booking_router
 from datetime import datetime, timezone
+import asyncio
 from config.cache import RedisCache
 from config.celery import background_task
 from celery import Celery, signature, shared_task
-
+from utils.fleet_snapshot import fleet_snapshot, listen_for_vehicle_updates
+from utils.driver_index import driver_index, listen_for_driver_updates
+from controllers.assignment_controller import run_periodic_assignment
+from utils.maps_client import maps_client
+from utils.detour_model import detour_model
 
 app = FastAPI()
 
@@ -22,6 +27,25 @@ app.include_router(vehicle_router)
 app.include_router(booking_router)
 
 
+@app.on_event("startup")
+async def start_fleet_listeners():
+    app.state.fleet_tasks = [
+        asyncio.create_task(fleet_snapshot.run_refresher()),
+        asyncio.create_task(listen_for_vehicle_updates(cache)),
+        asyncio.create_task(driver_index.run_refresher()),
+        asyncio.create_task(listen_for_driver_updates(cache)),
+        asyncio.create_task(run_periodic_assignment(cache)),
+        asyncio.create_task(detour_model.run_refresher()),
+    ]
+
+
+@app.on_event("shutdown")
+async def stop_fleet_listeners():
+    for task in app.state.fleet_tasks:
+        task.cancel()
+    await maps_client.close()
+
+
 @app.get("/head")
 async def head(db: AsyncSession = Depends(get_db)):
     """
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field
+from typing import Optional, List
 
 
 class UserOnboard(BaseModel):
@@ -25,12 +25,24 @@ class VehicleSearch(BaseModel):
     drop_longitude: float
 
 
+class VehicleSearchBatch(BaseModel):
+    queries: List[VehicleSearch] = Field(..., min_length=1, max_length=500)
+
+
 class BookingRequestCreate(BaseModel):
     user_id: str
     vehicle_id: str
     driver_id: str
     pickup_location: str
     drop_location: str
+    quote_token: Optional[str] = None
+
+
+class BookingQuoteRequest(BaseModel):
+    user_id: str
+    vehicle_id: str
+    pickup_location: str
+    drop_location: str
 
 
 class BookingRequestUserResponse(BaseModel):
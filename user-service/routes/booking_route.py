@@ -1,13 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from controllers.booking_controller import BookingsController
+from controllers.booking_controller import BookingsController, format_user_booking
+from controllers.assignment_controller import AssignmentController
+from controllers.import_controller import BookingImportController
 from models.models import Users
-from models.schema import BookingRequestCreate
+from models.schema import BookingRequestCreate, BookingQuoteRequest
 from config.database import get_db
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from typing import Literal
 
-from utils.token import verification
+from utils.token import verification, verify_admin
+from utils.streaming import wants_ndjson, ndjson_response
+from utils.pagination import decode_booking_cursor
+from utils.idempotency import idempotent_requests
+from utils.geocode_cache import geocode_cache
+from utils.route_cache import route_cache
+from utils.maps_client import maps_client
+from utils.detour_model import detour_model
+from utils.booking_tasks import price_booking
 
 booking_router = APIRouter(prefix="/booking", tags=["bookings"])
 
@@ -42,43 +54,233 @@ async def get_coordinates(
         )
 
 
+@booking_router.get("/geocode/stats")
+async def geocode_cache_stats():
+    """
+    Hit and miss counters of this worker's geocode cache.
+    """
+    return JSONResponse(content=geocode_cache.stats(), status_code=200)
+
+
+@booking_router.get("/route-cache/stats")
+async def route_cache_stats():
+    """
+    Hit and miss counters of this worker's route leg cache.
+    """
+    return JSONResponse(content=route_cache.stats(), status_code=200)
+
+
+@booking_router.get("/maps/status")
+async def maps_status():
+    """
+    Circuit breaker state of the maps API and the fallback detour factors.
+    """
+    return JSONResponse(
+        content={
+            "circuit": maps_client.breaker.stats(),
+            "latency_budget_seconds": maps_client.latency_budget,
+            "detour_model": detour_model.stats(),
+        },
+        status_code=200,
+    )
+
+
+@booking_router.post("/geocode/warm-up")
+async def warm_up_geocode_cache(
+    limit: int = Query(50000, ge=1),
+    authorization: str = Header(...),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Admin hook: fill the geocode cache from addresses of past bookings.
+    """
+    verify_admin(authorization.split(" ")[1])
+
+    try:
+        summary = await geocode_cache.warm_up(db, limit)
+        return JSONResponse(content=summary, status_code=200)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Server Error: Unable to warm up the geocode cache",
+        )
+
+
+@booking_router.post("/quote")
+async def quote_booking(
+    quote_data: BookingQuoteRequest,
+    user_id: str = Query(...),
+    authorization: str = Header(...),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Price a trip and return a short-lived signed quote token, which
+    /booking/new accepts in place of pricing the trip again.
+    """
+    verification(token=authorization.split(" ")[1], role="user", entity_id=user_id)
+    if quote_data.user_id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Unauthorized access",
+        )
+
+    controller = BookingsController(db)
+    try:
+        quote = await controller.quote_booking(quote_data)
+        return JSONResponse(content=quote, status_code=200)
+    except HTTPException as e:
+        if e.status_code < 500:
+            raise
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Server Error: Unable to quote booking.",
+        )
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Server Error: Unable to quote booking.",
+        )
+
+
 @booking_router.post("/new")
 async def create_booking(
     booking_data: BookingRequestCreate,
     user_id: str = Query(...),
+    mode: Literal["sync", "async"] = Query(
+        "sync", description="async: answer 202 at once and price in the background"
+    ),
     authorization: str = Header(...),
+    idempotency_key: str = Header(None),
     db: AsyncSession = Depends(get_db),
 ):
-    query = select(Users).filter(Users.userid == user_id)
-    result = await db.execute(query)
-    user = result.scalars().first()
-    if not user:
+    # The user is checked with the driver and vehicle in create_booking
+    verification(token=authorization.split(" ")[1], role="user", entity_id=user_id)
+    if booking_data.user_id != user_id:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found",
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Unauthorized access",
         )
+    controller = BookingsController(db)
+
+    async def create():
+        try:
+            # A valid quote needs no pricing, so it is booked right away
+            if mode == "async" and controller.quote_from_token(booking_data) is None:
+                booking_response = await controller.create_pricing_booking(booking_data)
+                try:
+                    # Publishing blocks while the broker is slow or retrying
+                    await run_in_threadpool(
+                        price_booking.delay, booking_response["booking_id"]
+                    )
+                except Exception:
+                    await controller.fail_pricing(booking_response["booking_id"])
+                    raise
+                return booking_response, 202
+
+            booking_response = await controller.create_booking(booking_data)
+            return booking_response, 201
+
+        except HTTPException as e:
+            if e.status_code < 500:
+                raise
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Server Error: Unable to create booking.",
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Server Error: Unable to create booking.",
+            )
 
+    # Retries with the same Idempotency-Key get the first booking back
+    return await idempotent_requests.respond(
+        f"booking-new:{user_id}",
+        idempotency_key,
+        {**booking_data.model_dump(), "mode": mode},
+        create,
+    )
+
+
+@booking_router.post("/import")
+async def import_bookings(
+    request: Request,
+    user_id: str = Query(...),
+    format: Literal["csv", "ndjson"] = Query(
+        None, description="Defaults to the request's Content-Type"
+    ),
+    authorization: str = Header(...),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Create many bookings from a CSV or NDJSON body with vehicle_id,
+    driver_id, pickup_location and drop_location per row. Answers with the
+    outcome of every row.
+    """
     verification(token=authorization.split(" ")[1], role="user", entity_id=user_id)
-    controller = BookingsController(db)
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if "csv" in content_type else "ndjson"
 
+    controller = BookingImportController(db)
     try:
-        booking_response = await controller.create_booking(booking_data)
-        return JSONResponse(
-            content=booking_response,
-            status_code=201,
+        body = (await request.body()).decode("utf-8-sig")
+        summary = await controller.import_bookings(user_id, body, format)
+        return JSONResponse(content=summary, status_code=200)
+    except HTTPException as e:
+        if e.status_code < 500:
+            raise
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Server Error: Unable to import bookings.",
+        )
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Import body must be UTF-8 text",
         )
 
-    except Exception as e:
+
+@booking_router.get("/status")
+async def get_booking_status(
+    booking_id: str = Query(...),
+    user_id: str = Query(...),
+    authorization: str = Header(...),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Poll a booking created in async mode: "Pricing" until its price is
+    ready, then "Pending" with the price details, or "Failed". Changes are
+    also published on the booking-updates Redis channel.
+    """
+    verification(token=authorization.split(" ")[1], role="user", entity_id=user_id)
+
+    controller = BookingsController(db)
+    try:
+        booking_status = await controller.get_booking_status(booking_id, user_id)
+        return JSONResponse(content=booking_status, status_code=200)
+    except HTTPException as e:
+        if e.status_code < 500:
+            raise
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Server Error: Unable to fetch booking status.",
+        )
+    except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Server Error: Unable to create booking.",
+            detail="Server Error: Unable to fetch booking status.",
         )
 
 
 @booking_router.get("/")
 async def get_user_bookings(
     user_id: str = Query(...),
+    stream: bool = Query(False, description="Stream bookings as NDJSON"),
+    limit: int = Query(None, ge=1, description="Page size, capped by the server"),
+    cursor: str = Query(None, description="X-Next-Cursor of the previous page"),
     authorization: str = Header(...),
+    accept: str = Header(None),
     db: AsyncSession = Depends(get_db),
 ):
     query = select(Users).filter(Users.userid == user_id)
@@ -93,9 +295,27 @@ async def get_user_bookings(
     verification(token=authorization.split(" ")[1], role="user", entity_id=user_id)
 
     controller = BookingsController(db)
+    if wants_ndjson(accept, stream):
+        return ndjson_response(
+            controller.user_bookings_query(user_id), format_user_booking
+        )
+
     try:
-        user_bookings = await controller.get_user_bookings(user_id)
-        return JSONResponse(content=user_bookings, status_code=200)
+        after = decode_booking_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+    try:
+        user_bookings = await controller.get_user_bookings(user_id, limit, after)
+        headers = {}
+        if user_bookings["next_cursor"]:
+            headers["X-Next-Cursor"] = user_bookings["next_cursor"]
+        return JSONResponse(
+            content=user_bookings["bookings"], status_code=200, headers=headers
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -131,3 +351,25 @@ async def update_order_status(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Server Error: Unable to update booking statuss",
         )
+
+
+@booking_router.post("/assign")
+async def assign_pending_bookings(
+    authorization: str = Header(...),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Admin hook: match the current window of pending bookings to vehicles
+    and drivers now instead of waiting for the periodic run.
+    """
+    verify_admin(authorization.split(" ")[1])
+
+    controller = AssignmentController(db)
+    try:
+        summary = await controller.assign_pending_bookings()
+        return JSONResponse(content=summary, status_code=200)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Server Error: Unable to assign pending bookings",
+        )
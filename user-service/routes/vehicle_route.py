@@ -3,11 +3,13 @@ from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from config.database import get_db
 from controllers.vehicle_controller import VehicleController
-from models.schema import VehicleSearch
+from models.schema import VehicleSearch, VehicleSearchBatch
 from sqlalchemy import select
 from models.models import Users
-from utils.token import verification
-
+from utils.token import verification, verify_admin
+from utils.pagination import decode_search_cursor
+from utils.search_cache import search_cache
+from utils.fleet_snapshot import fleet_snapshot
 
 vehicle_router = APIRouter(prefix="/vehicle", tags=["vehicles"])
 
@@ -16,6 +18,7 @@ vehicle_router = APIRouter(prefix="/vehicle", tags=["vehicles"])
 async def search_vehicles(
     search_params: VehicleSearch,
     user_id: str = Query(...),
+    cursor: str = Query(None, description="X-Next-Cursor of the previous page"),
     authorization: str = Header(...),
     db: AsyncSession = Depends(get_db),
 ):
@@ -32,8 +35,29 @@ async def search_vehicles(
 
     vehicle_instance = VehicleController(db)
     try:
-        vehicle_search_result = await vehicle_instance.search_vehicle(search_params)
-        return JSONResponse(content=vehicle_search_result, status_code=200)
+        search_cursor = (
+            decode_search_cursor(cursor, vehicle_instance.max_served)
+            if cursor
+            else None
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+    try:
+        vehicle_search_result = await vehicle_instance.search_vehicle(
+            search_params, cursor=search_cursor
+        )
+        headers = {}
+        if vehicle_search_result["next_cursor"]:
+            headers["X-Next-Cursor"] = vehicle_search_result["next_cursor"]
+        return JSONResponse(
+            content=vehicle_search_result["vehicles"],
+            status_code=200,
+            headers=headers,
+        )
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -41,6 +65,66 @@ async def search_vehicles(
         )
 
 
+@vehicle_router.post("/search/batch")
+async def search_vehicles_batch(
+    search_batch: VehicleSearchBatch,
+    user_id: str = Query(...),
+    authorization: str = Header(...),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Quote many shipments in one call. Results come back in query order, each
+    with the first page of vehicles and the cursor for /vehicle/search.
+    """
+    query = select(Users).filter(Users.userid == user_id)
+    result = await db.execute(query)
+    user = result.scalars().first()
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
+
+    verification(token=authorization.split(" ")[1], role="user", entity_id=user_id)
+
+    vehicle_instance = VehicleController(db)
+    try:
+        search_results = await vehicle_instance.search_vehicles_batch(
+            search_batch.queries
+        )
+        return JSONResponse(content={"results": search_results}, status_code=200)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Server Error: Unable to search vehicles",
+        )
+
+
+@vehicle_router.get("/search/cache-stats")
+async def search_cache_stats():
+    """
+    Hit rate of the vehicle search cache, for tuning its quantization.
+    """
+    return JSONResponse(content=await search_cache.stats(), status_code=200)
+
+
+@vehicle_router.post("/snapshot/refresh")
+async def refresh_fleet_snapshot(authorization: str = Header(...)):
+    """
+    Admin hook: rebuild this worker's fleet snapshot from the database.
+    """
+    verify_admin(authorization.split(" ")[1])
+
+    try:
+        await fleet_snapshot.refresh(full=True)
+        return JSONResponse(content=fleet_snapshot.stats(), status_code=200)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Server Error: Unable to refresh fleet snapshot",
+        )
+
+
 @vehicle_router.get("/search/driver")
 async def search_drivers(
     vehicle_id: str = Query(...),
@@ -68,3 +152,33 @@ async def search_drivers(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Server Error: Unable to search driver",
         )
+
+
+@vehicle_router.get("/search/drivers")
+async def search_nearest_drivers(
+    vehicle_id: str = Query(...),
+    user_id: str = Query(...),
+    k: int = Query(5, ge=1, le=50, description="Number of drivers to return"),
+    authorization: str = Header(...),
+    db: AsyncSession = Depends(get_db),
+):
+    query = select(Users).filter(Users.userid == user_id)
+    result = await db.execute(query)
+    user = result.scalars().first()
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
+
+    verification(token=authorization.split(" ")[1], role="user", entity_id=user_id)
+
+    vehicle_instance = VehicleController(db)
+    try:
+        drivers = await vehicle_instance.suggest_nearest_drivers(vehicle_id, k)
+        return JSONResponse(content=drivers, status_code=200)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Server Error: Unable to search drivers",
+        )
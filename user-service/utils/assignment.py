@@ -0,0 +1,44 @@
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+
+def cheapest_per_row(rows, cols, costs, per_row: int):
+    """
+    Keep the per_row cheapest candidate edges of every row.
+    """
+    order = np.lexsort((costs, rows))
+    rows, cols, costs = rows[order], cols[order], costs[order]
+
+    first_of_row = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    row_starts = np.repeat(first_of_row, np.diff(np.r_[first_of_row, len(rows)]))
+    keep = np.arange(len(rows)) - row_starts < per_row
+    return rows[keep], cols[keep], costs[keep]
+
+
+def min_cost_assignment(rows, cols, costs, n_rows: int, n_cols: int):
+    """
+    Minimum-cost matching over sparse candidate edges (LAPJVsp, a sparse
+    Jonker-Volgenant variant of the Hungarian method).
+
+    Every row also gets a private fallback column that costs more than all
+    real edges together, so a full matching always exists: the solver first
+    matches as many rows as it can, then picks the cheapest such matching.
+    Returns the matched (rows, cols) of real edges only.
+    """
+    if n_rows == 0 or len(costs) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    fallback_cost = float(costs.sum()) + 1.0
+    all_rows = np.concatenate([rows, np.arange(n_rows)])
+    all_cols = np.concatenate([cols, n_cols + np.arange(n_rows)])
+    # The solver treats zero weights as missing edges
+    all_costs = np.concatenate([costs, np.full(n_rows, fallback_cost)]) + 1.0
+
+    graph = coo_matrix(
+        (all_costs, (all_rows, all_cols)), shape=(n_rows, n_cols + n_rows)
+    ).tocsr()
+    matched_rows, matched_cols = min_weight_full_bipartite_matching(graph)
+
+    real = matched_cols < n_cols
+    return matched_rows[real], matched_cols[real]
@@ -0,0 +1,36 @@
+from config.celery import celery_app, run_in_worker_loop
+from config.database import SessionLocal
+from controllers.booking_controller import BookingsController
+
+# Retries back off 5s, 10s, 20s before the booking is marked "Failed"
+PRICING_RETRY_DELAY_SECONDS = 5
+
+
+async def price_or_fail(booking_id: str, final_attempt: bool):
+    async with SessionLocal() as session:
+        controller = BookingsController(session)
+        try:
+            await controller.price_booking(booking_id)
+        except Exception:
+            await session.rollback()
+            if final_attempt:
+                await controller.fail_pricing(booking_id)
+            raise
+
+
+@celery_app.task(bind=True, name="bookings.price_booking", max_retries=3)
+def price_booking(self, booking_id: str):
+    """
+    Price a booking created in async mode. The worker pool size, not the
+    web tier, bounds how many bookings call the maps API at once.
+    """
+    final_attempt = self.request.retries >= self.max_retries
+    try:
+        run_in_worker_loop(price_or_fail(booking_id, final_attempt))
+    except Exception as e:
+        if final_attempt:
+            print(f"Error pricing booking {booking_id}: {e}")
+            return
+        raise self.retry(
+            exc=e, countdown=PRICING_RETRY_DELAY_SECONDS * 2**self.request.retries
+        )
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import time
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import select
+from config.database import SessionLocal
+from models.models import BookingRequest
+from utils.helpers import LogisticsCalculations
+
+load_dotenv()
+
+
+class DetourModel:
+    """
+    Road distance over straight-line distance, learned per region from past
+    bookings, for pricing trips when the maps API cannot be used.
+
+    - Regions are cells of DETOUR_REGION_DEG degrees around the pickup point
+    - A region's factor is the median of distance_to_cover over the
+      pickup to drop haversine distance of its bookings; regions with too
+      few bookings use the median of all of them
+    - distance_to_cover also holds the vehicle's leg to the pickup, which
+      these bookings do not record, so the factors lean high and fallback
+      quotes err on the expensive side
+    """
+
+    DEFAULT_FACTOR = 1.3
+    MIN_FACTOR = 1.0
+    MAX_FACTOR = 3.0
+    # Short trips are dominated by the vehicle's leg to the pickup
+    MIN_TRIP_KM = 5
+
+    def __init__(self):
+        self.region_size_deg = float(os.getenv("DETOUR_REGION_DEG", 1.0))
+        self.min_samples = int(os.getenv("DETOUR_MIN_SAMPLES", 20))
+        self.sample_size = int(os.getenv("DETOUR_SAMPLE_SIZE", 100000))
+        self.refresh_interval = float(os.getenv("DETOUR_REFRESH_SECONDS", 60 * 60))
+        self.speed_kmph = float(os.getenv("FALLBACK_SPEED_KMPH", 40))
+        self.logistic_calculator = LogisticsCalculations()
+        self.factors = {}
+        self.default_factor = self.DEFAULT_FACTOR
+        self.samples = 0
+        self.refreshed_at = None
+
+    def region_for(self, latitude, longitude):
+        return (
+            int(np.floor(latitude / self.region_size_deg)),
+            int(np.floor(longitude / self.region_size_deg)),
+        )
+
+    async def refresh(self):
+        query = (
+            select(
+                BookingRequest.pickup_latitude,
+                BookingRequest.pickup_longitude,
+                BookingRequest.drop_latitude,
+                BookingRequest.drop_longitude,
+                BookingRequest.distance_to_cover,
+            )
+            .filter(
+                BookingRequest.pickup_latitude.isnot(None),
+                BookingRequest.pickup_longitude.isnot(None),
+                BookingRequest.drop_latitude.isnot(None),
+                BookingRequest.drop_longitude.isnot(None),
+                BookingRequest.distance_to_cover > 0,
+            )
+            .order_by(BookingRequest.created_at.desc())
+            .limit(self.sample_size)
+        )
+        async with SessionLocal() as session:
+            rows = (await session.execute(query)).all()
+
+        columns = np.array(rows, dtype=np.float64).reshape(-1, 5)
+        pickup_lats, pickup_lons, drop_lats, drop_lons, distances = columns.T
+        straight = self.logistic_calculator.calculate_estimated_distances(
+            pickup_lats, pickup_lons, drop_lats, drop_lons
+        )
+        usable = straight >= self.MIN_TRIP_KM
+        ratios = np.clip(
+            distances[usable] / straight[usable], self.MIN_FACTOR, self.MAX_FACTOR
+        )
+        region_rows = np.floor(pickup_lats[usable] / self.region_size_deg).astype(
+            np.int64
+        )
+        region_cols = np.floor(pickup_lons[usable] / self.region_size_deg).astype(
+            np.int64
+        )
+
+        factors = {}
+        if len(ratios):
+            order = np.lexsort((ratios, region_cols, region_rows))
+            ratios, region_rows, region_cols = (
+                ratios[order],
+                region_rows[order],
+                region_cols[order],
+            )
+            starts = np.flatnonzero(
+                np.r_[
+                    True,
+                    (region_rows[1:] != region_rows[:-1])
+                    | (region_cols[1:] != region_cols[:-1]),
+                ]
+            )
+            for start, end in zip(starts, np.r_[starts[1:], len(ratios)]):
+                if end - start >= self.min_samples:
+                    factors[(int(region_rows[start]), int(region_cols[start]))] = float(
+                        np.median(ratios[start:end])
+                    )
+
+        self.factors = factors
+        self.default_factor = (
+            float(np.median(ratios))
+            if len(ratios) >= self.min_samples
+            else self.DEFAULT_FACTOR
+        )
+        self.samples = len(ratios)
+        self.refreshed_at = time.time()
+        return self.stats()
+
+    def factor_for(self, latitude, longitude):
+        return self.factors.get(
+            self.region_for(latitude, longitude), self.default_factor
+        )
+
+    def factors_for(self, latitudes, longitudes):
+        return np.fromiter(
+            (
+                self.factor_for(latitude, longitude)
+                for latitude, longitude in zip(latitudes, longitudes)
+            ),
+            dtype=np.float64,
+            count=len(latitudes),
+        )
+
+    def estimate_leg(self, origin, destination):
+        """
+        (distance in metres, duration in seconds) of a road trip between two
+        points, in the same units the distance matrix returns.
+        """
+        distance_km = self.logistic_calculator.calculate_estimated_distance(
+            *origin, *destination
+        ) * self.factor_for(*origin)
+        return int(distance_km * 1000), int(distance_km / self.speed_kmph * 3600)
+
+    async def run_refresher(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error refreshing detour factors: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def stats(self):
+        return {
+            "regions": len(self.factors),
+            "default_factor": round(self.default_factor, 3),
+            "samples": self.samples,
+            "region_size_deg": self.region_size_deg,
+            "speed_kmph": self.speed_kmph,
+            "refreshed_at": self.refreshed_at,
+        }
+
+
+detour_model = DetourModel()
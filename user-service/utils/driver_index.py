@@ -0,0 +1,336 @@
+import asyncio
+import os
+import time
+from datetime import timedelta
+import numpy as np
+from dotenv import load_dotenv
+from scipy.spatial import cKDTree
+from sqlalchemy import select, or_, func
+from config.cache import RedisCache, DRIVER_UPDATES_CHANNEL
+from config.database import SessionLocal
+from models.models import Driver
+
+load_dotenv()
+
+EARTH_RADIUS_KM = 6371
+
+DRIVER_INDEX_COLUMNS = (
+    Driver.driverid,
+    Driver.name,
+    Driver.email,
+    Driver.mobile,
+    Driver.current_latitude,
+    Driver.current_longitude,
+    Driver.availability,
+)
+
+
+def unit_vectors(latitudes, longitudes):
+    """
+    Points on the unit sphere. Straight-line (chord) distance between them
+    orders neighbours exactly like great-circle distance, so a plain
+    Euclidean KD-tree can answer nearest-driver queries.
+    """
+    latitudes = np.radians(latitudes)
+    longitudes = np.radians(longitudes)
+    cos_latitudes = np.cos(latitudes)
+    return np.column_stack(
+        (
+            cos_latitudes * np.cos(longitudes),
+            cos_latitudes * np.sin(longitudes),
+            np.sin(latitudes),
+        )
+    )
+
+
+def chord_for(distance_km):
+    return 2 * np.sin(np.minimum(distance_km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+def distance_for(chords):
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.minimum(chords / 2, 1.0))
+
+
+class DriverIndex:
+    """
+    In-memory k-nearest-neighbour index of available drivers, kept in each
+    worker.
+
+    - Driver rows live in NumPy arrays, one position per driver
+    - A KD-tree over the available drivers answers k-nearest queries
+    - Drivers changed since the tree was built are left out of its answers
+      and checked directly instead; the tree is rebuilt once too many have
+      changed
+    - Refreshed from the created_at/updated_at watermark, on a timer and
+      whenever driver-service or admin-service publish a driver change
+    """
+
+    WATERMARK_OVERLAP = timedelta(seconds=5)
+
+    # Rebuild the tree once this many drivers (or this share of them) changed
+    MIN_REBUILD_CHANGES = 64
+    REBUILD_CHANGE_RATIO = 0.05
+
+    def __init__(self):
+        self.max_staleness = float(os.getenv("DRIVER_INDEX_MAX_STALENESS_SECONDS", 5))
+        self.reset()
+        self._refresh_lock = None
+        self._wakeup = None
+
+    def reset(self):
+        self.size = 0
+        self.positions = {}
+        self.driver_ids = np.empty(0, dtype=object)
+        self.names = np.empty(0, dtype=object)
+        self.emails = np.empty(0, dtype=object)
+        self.mobiles = np.empty(0, dtype=object)
+        self.latitudes = np.empty(0, dtype=np.float64)
+        self.longitudes = np.empty(0, dtype=np.float64)
+        self.available = np.empty(0, dtype=bool)
+        self.changed = np.empty(0, dtype=bool)
+        self.changed_positions = set()
+        self.tree = None
+        self.tree_members = np.empty(0, dtype=np.int64)
+        self.watermark = None
+        self.refreshed_at = None
+
+    def _columns(self):
+        return (
+            "driver_ids",
+            "names",
+            "emails",
+            "mobiles",
+            "latitudes",
+            "longitudes",
+            "available",
+            "changed",
+        )
+
+    def _grow(self, needed: int):
+        capacity = len(self.driver_ids)
+        if needed <= capacity:
+            return
+
+        new_capacity = max(needed, capacity * 2, 1024)
+        for column in self._columns():
+            old = getattr(self, column)
+            new = np.zeros(new_capacity, dtype=old.dtype)
+            new[: self.size] = old[: self.size]
+            setattr(self, column, new)
+
+    def apply(self, rows):
+        self._grow(self.size + len(rows))
+
+        for row in rows:
+            position = self.positions.get(row.driverid)
+            if position is None:
+                position = self.size
+                self.positions[row.driverid] = position
+                self.size += 1
+
+            self.driver_ids[position] = row.driverid
+            self.names[position] = row.name
+            self.emails[position] = row.email
+            self.mobiles[position] = row.mobile
+
+            if row.current_latitude is None or row.current_longitude is None:
+                self.latitudes[position] = np.nan
+                self.longitudes[position] = np.nan
+                self.available[position] = False
+            else:
+                self.latitudes[position] = row.current_latitude
+                self.longitudes[position] = row.current_longitude
+                self.available[position] = bool(row.availability)
+
+            self.changed[position] = True
+            self.changed_positions.add(position)
+
+        if len(self.changed_positions) > max(
+            self.MIN_REBUILD_CHANGES, self.REBUILD_CHANGE_RATIO * self.size
+        ):
+            self.rebuild()
+
+    def rebuild(self):
+        members = np.flatnonzero(self.available[: self.size])
+        self.tree_members = members
+        self.tree = (
+            cKDTree(unit_vectors(self.latitudes[members], self.longitudes[members]))
+            if len(members)
+            else None
+        )
+        self.changed[: self.size] = False
+        self.changed_positions = set()
+
+    async def refresh(self, full: bool = False):
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+
+        async with self._refresh_lock:
+            changed_at = func.coalesce(Driver.updated_at, Driver.created_at)
+            query = select(*DRIVER_INDEX_COLUMNS, changed_at.label("changed_at"))
+
+            if not full and self.watermark is not None:
+                since = self.watermark - self.WATERMARK_OVERLAP
+                query = query.filter(
+                    or_(Driver.updated_at >= since, Driver.created_at >= since)
+                )
+
+            started_at = time.monotonic()
+            async with SessionLocal() as session:
+                rows = (await session.execute(query)).all()
+
+            if full or self.watermark is None:
+                self.reset()
+                self.apply(rows)
+                self.rebuild()
+            else:
+                self.apply(rows)
+
+            for row in rows:
+                if row.changed_at is not None and (
+                    self.watermark is None or row.changed_at > self.watermark
+                ):
+                    self.watermark = row.changed_at
+            self.refreshed_at = started_at
+
+            return len(rows)
+
+    def staleness(self):
+        if self.refreshed_at is None:
+            return None
+        return time.monotonic() - self.refreshed_at
+
+    async def ensure_fresh(self):
+        staleness = self.staleness()
+        if staleness is None or staleness > self.max_staleness:
+            await self.refresh()
+
+    def request_refresh(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run_refresher(self):
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error refreshing driver index: {e}")
+
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=self.max_staleness / 2
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _query_tree(self, point, k, max_chord):
+        """
+        k nearest tree entries that are still current. Entries for drivers
+        changed since the build are dropped, so the query is widened until
+        k current ones are found or the radius is exhausted.
+        """
+        tree_size = len(self.tree_members)
+        tree_k = min(k, tree_size)
+        while True:
+            tree_chords, tree_indexes = self.tree.query(
+                point, k=tree_k, distance_upper_bound=max_chord
+            )
+            tree_chords = np.atleast_1d(tree_chords)
+            tree_indexes = np.atleast_1d(tree_indexes)
+
+            found = tree_indexes < tree_size
+            members = self.tree_members[tree_indexes[found]]
+            current = ~self.changed[members]
+            exhausted = not found.all() or tree_k == tree_size
+            if current.sum() >= k or exhausted:
+                return members[current], tree_chords[found][current]
+            tree_k = min(tree_k * 2, tree_size)
+
+    def nearest(self, latitude, longitude, k: int, max_distance_km: float):
+        """
+        Positions and distances (km) of the k nearest available drivers
+        within max_distance_km, closest first.
+        """
+        point = unit_vectors(latitude, longitude)[0]
+        max_chord = chord_for(max_distance_km)
+
+        positions, chords = [], []
+        if self.tree is not None:
+            members, member_chords = self._query_tree(point, k, max_chord)
+            positions.append(members)
+            chords.append(member_chords)
+
+        if self.changed_positions:
+            members = np.fromiter(self.changed_positions, dtype=np.int64)
+            members = members[self.available[members]]
+            member_chords = np.linalg.norm(
+                unit_vectors(self.latitudes[members], self.longitudes[members]) - point,
+                axis=1,
+            )
+            within = member_chords <= max_chord
+            positions.append(members[within])
+            chords.append(member_chords[within])
+
+        if not positions:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        positions = np.concatenate(positions)
+        chords = np.concatenate(chords)
+        order = np.argsort(chords, kind="stable")[:k]
+        return positions[order], np.round(distance_for(chords[order]), 2)
+
+    def live_drivers(self, locations):
+        """
+        Positions and live coordinates of the drivers a geo index search
+        found. Drivers the index has not loaded yet are skipped.
+        """
+        positions, latitudes, longitudes = [], [], []
+        for driver_id, latitude, longitude in locations:
+            position = self.positions.get(driver_id)
+            if position is not None:
+                positions.append(position)
+                latitudes.append(latitude)
+                longitudes.append(longitude)
+
+        return (
+            np.array(positions, dtype=np.int64),
+            np.array(latitudes, dtype=np.float64),
+            np.array(longitudes, dtype=np.float64),
+        )
+
+    def stats(self):
+        staleness = self.staleness()
+        return {
+            "drivers": self.size,
+            "available": int(self.available[: self.size].sum()),
+            "indexed": len(self.tree_members),
+            "pending_changes": len(self.changed_positions),
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "staleness_seconds": round(staleness, 3) if staleness is not None else None,
+            "max_staleness_seconds": self.max_staleness,
+        }
+
+
+driver_index = DriverIndex()
+
+
+async def listen_for_driver_updates(cache: RedisCache, retry_after: int = 5):
+    """
+    Wake the driver index refresher as soon as a driver's availability or
+    location changes.
+    """
+    while True:
+        try:
+            pubsub = await cache.subscribe(DRIVER_UPDATES_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    driver_index.request_refresh()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error listening for driver updates: {e}")
+            await asyncio.sleep(retry_after)
@@ -0,0 +1,250 @@
+import asyncio
+import os
+import time
+from datetime import timedelta
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import select, or_, func
+from config.cache import RedisCache, VEHICLE_UPDATES_CHANNEL
+from config.database import SessionLocal
+from models.models import Vehicle
+from utils.spatial_index import VehicleGridIndex
+
+load_dotenv()
+
+SNAPSHOT_COLUMNS = (
+    Vehicle.vehicleid,
+    Vehicle.registration_number,
+    Vehicle.model_name,
+    Vehicle.capacity_in_kg,
+    Vehicle.current_latitude,
+    Vehicle.current_longitude,
+    Vehicle.fuel_type,
+    Vehicle.is_available,
+    Vehicle.active_status,
+)
+
+
+class FleetSnapshot:
+    """
+    Compact, array-backed copy of the vehicle fleet kept in each worker.
+
+    - One NumPy array per column, one row position per vehicle
+    - Refreshed incrementally from the created_at/updated_at watermark, on a
+      timer and whenever admin or driver services publish a vehicle change
+    - Searches read it without touching the database; max_staleness bounds
+      how old it may get before a search refreshes it inline
+    """
+
+    # Re-read rows slightly older than the watermark, so a transaction that
+    # committed late with an earlier now() is not missed
+    WATERMARK_OVERLAP = timedelta(seconds=5)
+
+    def __init__(self):
+        self.max_staleness = float(os.getenv("FLEET_SNAPSHOT_MAX_STALENESS_SECONDS", 5))
+        self.grid = VehicleGridIndex()
+        self.reset()
+        self._refresh_lock = None
+        self._wakeup = None
+
+    def reset(self):
+        self.size = 0
+        self.positions = {}
+        self.vehicle_ids = np.empty(0, dtype=object)
+        self.registration_numbers = np.empty(0, dtype=object)
+        self.model_names = np.empty(0, dtype=object)
+        self.fuel_types = np.empty(0, dtype=object)
+        self.capacities = np.empty(0, dtype=np.float64)
+        self.latitudes = np.empty(0, dtype=np.float64)
+        self.longitudes = np.empty(0, dtype=np.float64)
+        self.available = np.empty(0, dtype=bool)
+        self.watermark = None
+        self.refreshed_at = None
+        self.grid.clear()
+
+    def _columns(self):
+        return (
+            "vehicle_ids",
+            "registration_numbers",
+            "model_names",
+            "fuel_types",
+            "capacities",
+            "latitudes",
+            "longitudes",
+            "available",
+        )
+
+    def _grow(self, needed: int):
+        capacity = len(self.vehicle_ids)
+        if needed <= capacity:
+            return
+
+        new_capacity = max(needed, capacity * 2, 1024)
+        for column in self._columns():
+            old = getattr(self, column)
+            new = np.zeros(new_capacity, dtype=old.dtype)
+            new[: self.size] = old[: self.size]
+            setattr(self, column, new)
+
+    def apply(self, rows):
+        self._grow(self.size + len(rows))
+
+        for row in rows:
+            position = self.positions.get(row.vehicleid)
+            if position is None:
+                position = self.size
+                self.positions[row.vehicleid] = position
+                self.size += 1
+
+            self.vehicle_ids[position] = row.vehicleid
+            self.registration_numbers[position] = row.registration_number
+            self.model_names[position] = row.model_name
+            self.fuel_types[position] = row.fuel_type
+            self.capacities[position] = (
+                row.capacity_in_kg if row.capacity_in_kg is not None else np.nan
+            )
+            self.available[position] = bool(row.is_available and row.active_status)
+
+            if row.current_latitude is None or row.current_longitude is None:
+                self.latitudes[position] = np.nan
+                self.longitudes[position] = np.nan
+                self.available[position] = False
+                self.grid.remove(position)
+            else:
+                self.latitudes[position] = row.current_latitude
+                self.longitudes[position] = row.current_longitude
+                self.grid.upsert(position, row.current_latitude, row.current_longitude)
+
+    async def refresh(self, full: bool = False):
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+
+        async with self._refresh_lock:
+            changed_at = func.coalesce(Vehicle.updated_at, Vehicle.created_at)
+            query = select(*SNAPSHOT_COLUMNS, changed_at.label("changed_at"))
+
+            if not full and self.watermark is not None:
+                since = self.watermark - self.WATERMARK_OVERLAP
+                query = query.filter(
+                    or_(Vehicle.updated_at >= since, Vehicle.created_at >= since)
+                )
+
+            started_at = time.monotonic()
+            async with SessionLocal() as session:
+                rows = (await session.execute(query)).all()
+
+            if full or self.watermark is None:
+                self.reset()
+
+            self.apply(rows)
+            for row in rows:
+                if row.changed_at is not None and (
+                    self.watermark is None or row.changed_at > self.watermark
+                ):
+                    self.watermark = row.changed_at
+            self.refreshed_at = started_at
+
+            return len(rows)
+
+    def staleness(self):
+        if self.refreshed_at is None:
+            return None
+        return time.monotonic() - self.refreshed_at
+
+    async def ensure_fresh(self):
+        staleness = self.staleness()
+        if staleness is None or staleness > self.max_staleness:
+            await self.refresh()
+
+    def request_refresh(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run_refresher(self):
+        """
+        Keep the snapshot within max_staleness without putting the refresh
+        on a search request.
+        """
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error refreshing fleet snapshot: {e}")
+
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=self.max_staleness / 2
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def candidates(self, latitude, longitude, min_count, max_distance_km, min_capacity):
+        """
+        Snapshot positions of available vehicles with enough capacity around
+        the point.
+        """
+        return self.grid.candidates(
+            latitude,
+            longitude,
+            min_count,
+            max_distance_km,
+            lambda positions: self.available[positions]
+            & (self.capacities[positions] >= min_capacity),
+        )
+
+    def live_candidates(self, locations, min_capacity):
+        """
+        Positions and live coordinates of the vehicles a geo index search
+        found, keeping those with enough capacity. Vehicles the snapshot has
+        not loaded yet are skipped until its next refresh.
+        """
+        positions, latitudes, longitudes = [], [], []
+        for vehicle_id, latitude, longitude in locations:
+            position = self.positions.get(vehicle_id)
+            if position is not None and self.capacities[position] >= min_capacity:
+                positions.append(position)
+                latitudes.append(latitude)
+                longitudes.append(longitude)
+
+        return (
+            np.array(positions, dtype=np.int64),
+            np.array(latitudes, dtype=np.float64),
+            np.array(longitudes, dtype=np.float64),
+        )
+
+    def stats(self):
+        staleness = self.staleness()
+        return {
+            "vehicles": self.size,
+            "available": int(self.available[: self.size].sum()),
+            "occupied_cells": len(self.grid.cells),
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "staleness_seconds": round(staleness, 3) if staleness is not None else None,
+            "max_staleness_seconds": self.max_staleness,
+        }
+
+
+fleet_snapshot = FleetSnapshot()
+
+
+async def listen_for_vehicle_updates(cache: RedisCache, retry_after: int = 5):
+    """
+    Wake the snapshot refresher as soon as admin-service or driver-service
+    publishes a vehicle change. Missed messages only delay the change until
+    the next timed refresh, since refreshes follow the database watermark.
+    """
+    while True:
+        try:
+            pubsub = await cache.subscribe(VEHICLE_UPDATES_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    fleet_snapshot.request_refresh()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error listening for vehicle updates: {e}")
+            await asyncio.sleep(retry_after)
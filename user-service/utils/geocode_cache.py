@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+from dotenv import load_dotenv
+from sqlalchemy import select
+from config.cache import RedisCache, GEOCODE_CACHE_PREFIX
+from models.models import BookingRequest
+
+load_dotenv()
+
+
+class GeocodeCache:
+    """
+    Two-tier cache of geocoded addresses.
+
+    - A per-process LRU answers repeated addresses without a network call
+    - Redis shares results between workers and survives restarts, with a
+      long expiry since addresses rarely move
+    - Keys are built from normalized address text, so case, spacing and
+      punctuation differences share one entry
+    - Concurrent misses for the same address share one geocoder call
+    """
+
+    def __init__(self, cache: RedisCache):
+        self.cache = cache
+        self.max_entries = int(os.getenv("GEOCODE_CACHE_LRU_SIZE", 10000))
+        self.expiry = int(os.getenv("GEOCODE_CACHE_TTL_SECONDS", 30 * 24 * 60 * 60))
+        self.local = OrderedDict()
+        self.in_flight = {}
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    def normalize(self, address: str):
+        address = unicodedata.normalize("NFKC", address).casefold()
+        address = re.sub(r"[^\w\s,]", " ", address)
+        parts = (" ".join(part.split()) for part in address.split(","))
+        return ", ".join(part for part in parts if part)
+
+    def key_for(self, address: str):
+        digest = hashlib.sha1(self.normalize(address).encode()).hexdigest()
+        return f"{GEOCODE_CACHE_PREFIX}:{digest}"
+
+    def _remember(self, key, coordinates):
+        self.local[key] = coordinates
+        self.local.move_to_end(key)
+        while len(self.local) > self.max_entries:
+            self.local.popitem(last=False)
+
+    async def geocode(self, address: str, geocoder):
+        """
+        [lat, lng] of the address, or None. geocoder is the coroutine
+        function used on a miss. Failed lookups are not cached.
+        """
+        key = self.key_for(address)
+
+        coordinates = self.local.get(key)
+        if coordinates is not None:
+            self.local.move_to_end(key)
+            self.local_hits += 1
+            return coordinates
+
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        pending = asyncio.ensure_future(self._load(key, address, geocoder))
+        self.in_flight[key] = pending
+        pending.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        return await asyncio.shield(pending)
+
+    async def _load(self, key, address, geocoder):
+        coordinates = await self.cache.get_cache(key)
+        if coordinates is not None:
+            self.redis_hits += 1
+            self._remember(key, coordinates)
+            return coordinates
+
+        self.misses += 1
+        coordinates = await geocoder(address)
+        if coordinates is not None:
+            coordinates = [float(coordinates[0]), float(coordinates[1])]
+            await self.cache.set_cache(key, str(coordinates), expiry=self.expiry)
+            self._remember(key, coordinates)
+        return coordinates
+
+    async def geocode_many(self, addresses, geocoder, concurrency: int = None):
+        """
+        Coordinates of every address, in order. concurrency caps the lookups
+        running at once, for large batches.
+        """
+        if concurrency is None:
+            return await asyncio.gather(
+                *(self.geocode(address, geocoder) for address in addresses)
+            )
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded(address):
+            async with semaphore:
+                return await self.geocode(address, geocoder)
+
+        return await asyncio.gather(*(bounded(address) for address in addresses))
+
+    async def warm_up(self, db, limit: int = 50000):
+        """
+        Load the coordinates already stored on bookings, newest first, into
+        both tiers. No geocoder calls are made.
+        """
+        locations = {}
+        for location, latitude, longitude in (
+            (
+                BookingRequest.pickup_location,
+                BookingRequest.pickup_latitude,
+                BookingRequest.pickup_longitude,
+            ),
+            (
+                BookingRequest.drop_location,
+                BookingRequest.drop_latitude,
+                BookingRequest.drop_longitude,
+            ),
+        ):
+            query = (
+                select(location, latitude, longitude)
+                .filter(
+                    location.isnot(None),
+                    latitude.isnot(None),
+                    longitude.isnot(None),
+                )
+                .order_by(BookingRequest.created_at.desc(), BookingRequest.id.desc())
+                .limit(limit)
+            )
+            async for row in await db.stream(query):
+                key = self.key_for(row[0])
+                if key not in locations:
+                    locations[key] = [float(row[1]), float(row[2])]
+
+        known = await self.cache.get_many(list(locations))
+        missing = {
+            key: coordinates
+            for (key, coordinates), cached in zip(locations.items(), known)
+            if cached is None
+        }
+        await self.cache.set_many(missing, expiry=self.expiry)
+
+        for key, coordinates in list(locations.items())[: self.max_entries][::-1]:
+            self._remember(key, coordinates)
+
+        return {"addresses": len(locations), "added_to_redis": len(missing)}
+
+    def stats(self):
+        hits = self.local_hits + self.redis_hits + self.coalesced
+        lookups = hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "local_entries": len(self.local),
+            "max_local_entries": self.max_entries,
+            "ttl_seconds": self.expiry,
+        }
+
+
+geocode_cache = GeocodeCache(RedisCache())
@@ -1,7 +1,11 @@
 import os
 import math
+import asyncio
 from dotenv import load_dotenv
-import googlemaps
+import httpx
+import numpy as np
+from utils.maps_client import maps_client, MapsError
+from utils.route_cache import route_cache
 
 load_dotenv()
 
@@ -13,8 +17,7 @@ class LogisticsCalculations:
 
     def __init__(self):
         self.FUEL_RATES = {"Petrol": 100, "Diesel": 90, "Electric": 60}
-        self.API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
-        self.gmaps = googlemaps.Client(key=self.API_KEY)
+        self.maps = maps_client
 
     def calculate_estimated_distance(
         self, from_latitude, from_longitude, to_latitude, to_longitude
@@ -85,57 +88,222 @@ class LogisticsCalculations:
             "total_price": round(total_price, 2),
         }
 
-    def geocode_address(self, address: str):
+    def calculate_estimated_distances(
+        self, from_latitude, from_longitude, to_latitudes, to_longitudes
+    ):
+        """
+        Vectorized Haversine distance. Either side may be a single point or
+        arrays of points; they are broadcast against each other.
+        """
+        from_latitude = np.radians(np.asarray(from_latitude, dtype=np.float64))
+        from_longitude = np.radians(np.asarray(from_longitude, dtype=np.float64))
+        to_latitudes = np.radians(np.asarray(to_latitudes, dtype=np.float64))
+        to_longitudes = np.radians(np.asarray(to_longitudes, dtype=np.float64))
+
+        haversine_formula = (
+            np.sin((to_latitudes - from_latitude) / 2) ** 2
+            + np.cos(from_latitude)
+            * np.cos(to_latitudes)
+            * np.sin((to_longitudes - from_longitude) / 2) ** 2
+        )
+        central_angle = 2 * np.arctan2(
+            np.sqrt(haversine_formula), np.sqrt(1 - haversine_formula)
+        )
+
+        earth_radius_km = 6371
+        return np.round(earth_radius_km * central_angle, 2)
+
+    def calculate_bounding_box(self, latitude, longitude, radius_km):
+        """
+        Lat/lon box that contains every point within radius_km of the point.
+        Longitude bounds are None when the box wraps a pole or the antimeridian.
+        """
+        earth_radius_km = 6371
+        delta_latitude = math.degrees(radius_km / earth_radius_km)
+        min_latitude = latitude - delta_latitude
+        max_latitude = latitude + delta_latitude
+
+        if min_latitude <= -90 or max_latitude >= 90:
+            return max(min_latitude, -90), min(max_latitude, 90), None, None
+
+        delta_longitude = math.degrees(
+            math.asin(
+                min(
+                    math.sin(radius_km / earth_radius_km)
+                    / math.cos(math.radians(latitude)),
+                    1,
+                )
+            )
+        )
+        min_longitude = longitude - delta_longitude
+        max_longitude = longitude + delta_longitude
+
+        if min_longitude < -180 or max_longitude > 180:
+            return min_latitude, max_latitude, None, None
+
+        return min_latitude, max_latitude, min_longitude, max_longitude
+
+    def fuel_rates_for(self, fuel_types):
+        rate_of = {
+            fuel_type: self.FUEL_RATES.get(fuel_type, 10)
+            for fuel_type in set(fuel_types)
+        }
+        return np.fromiter(
+            (rate_of[fuel_type] for fuel_type in fuel_types),
+            dtype=np.float64,
+            count=len(fuel_types),
+        )
+
+    def calculate_estimated_prices(
+        self,
+        vehicle_lats,
+        vehicle_lons,
+        pickup_lat,
+        pickup_lon,
+        drop_lat,
+        drop_lon,
+        fuel_types,
+        detour_factors=1.0,
+    ):
+        """
+        Batch version of calculate_estimated_price for many vehicles.
+        Pickup and drop are either one trip, whose pickup to drop leg is then
+        computed once and shared by every vehicle, or arrays with one trip per
+        vehicle. detour_factors scales straight-line distances to road
+        distances, per trip or for all of them.
+        """
+        distance_vehicle_to_pickup = (
+            self.calculate_estimated_distances(
+                pickup_lat, pickup_lon, vehicle_lats, vehicle_lons
+            )
+            * detour_factors
+        )
+        distance_pickup_to_drop = (
+            self.calculate_estimated_distances(
+                pickup_lat, pickup_lon, drop_lat, drop_lon
+            )
+            * detour_factors
+        )
+
+        total_distance = distance_vehicle_to_pickup + distance_pickup_to_drop
+
+        base_price = total_distance * self.fuel_rates_for(fuel_types)
+        gst = base_price * 0.28
+        platform_fee = base_price * 0.15
+
+        total_price = base_price + gst + platform_fee
+
+        return {
+            "distance_from_pickup": distance_vehicle_to_pickup,
+            "total_distance_km": np.round(total_distance, 2),
+            "base_price": np.round(base_price, 2),
+            "gst": np.round(gst, 2),
+            "platform_fee": np.round(platform_fee, 2),
+            "total_price": np.round(total_price, 2),
+        }
+
+    async def geocode_address(self, address: str):
         try:
-            geocode_result = self.gmaps.geocode(address)
+            geocode_result = await self.maps.geocode(address)
             coordinates = geocode_result[0]["geometry"]["location"]
             return [coordinates["lat"], coordinates["lng"]]
         except Exception:
             return None
 
-    def calculate_distance_time_price(
-        self, vehicle_lat, vehicle_lng, origin_address, destination_address, fuel_type
-    ):
-        try:
-            origin_coordinates = self.geocode_address(origin_address)
-            destination_coordinates = self.geocode_address(destination_address)
+    async def route_legs(self, legs, mode: str = "driving", fallback=None):
+        """
+        (distance in metres, duration in seconds) of every (origin,
+        destination) leg, and whether any of them is an estimate. Legs
+        missing from the route cache are fetched in one distance matrix
+        request with every missing origin and destination; the matrix
+        diagonal holds the requested legs.
 
-            origin_vehicle_distance_matrix = self.gmaps.distance_matrix(
-                (vehicle_lat, vehicle_lng), tuple(origin_coordinates), mode="driving"
-            )
+        With a fallback(origin, destination) estimator, legs the maps API
+        cannot answer within its latency budget, or at all while its circuit
+        is open, are estimated instead. Estimates are not cached.
+        """
+        results = [
+            route_cache.get(origin, destination, mode) for origin, destination in legs
+        ]
+        missing = [index for index, leg in enumerate(results) if leg is None]
+        if not missing:
+            return results, False
 
-            origin_to_vehicle_distance = origin_vehicle_distance_matrix["rows"][0][
-                "elements"
-            ][0]["distance"]
-            origin_to_vehicle_distance_in_km = (
-                int(origin_to_vehicle_distance["value"]) // 1000
+        try:
+            distance_matrix = await asyncio.wait_for(
+                self.maps.distance_matrix(
+                    [legs[index][0] for index in missing],
+                    [legs[index][1] for index in missing],
+                    mode=mode,
+                ),
+                timeout=self.maps.latency_budget if fallback else None,
             )
+        except (MapsError, httpx.HTTPError, asyncio.TimeoutError):
+            if fallback is None:
+                raise
+            for index in missing:
+                results[index] = fallback(*legs[index])
+            return results, True
 
-            origin_to_vehicle_duration = origin_vehicle_distance_matrix["rows"][0][
-                "elements"
-            ][0]["duration"]
-            origin_to_vehicle_duration_in_hr = (
-                int(origin_to_vehicle_duration["value"]) // 60
-            ) // 60
+        for row, index in enumerate(missing):
+            element = distance_matrix["rows"][row]["elements"][row]
+            if element.get("status") != "OK":
+                raise MapsError(
+                    f"No route for leg {legs[index]}: {element.get('status')}"
+                )
 
-            origin_destination_distance_matrix = self.gmaps.distance_matrix(
-                tuple(origin_coordinates),
-                tuple(destination_coordinates),
-                mode="driving",
-            )
+            leg = (element["distance"]["value"], element["duration"]["value"])
+            route_cache.set(*legs[index], mode, leg)
+            results[index] = leg
+
+        return results, False
 
-            origin_to_destination_distance = origin_destination_distance_matrix["rows"][
-                0
-            ]["elements"][0]["distance"]
+    async def calculate_distance_time_price(
+        self,
+        vehicle_lat,
+        vehicle_lng,
+        origin_address,
+        destination_address,
+        fuel_type,
+        origin_coordinates=None,
+        destination_coordinates=None,
+        fallback=None,
+    ):
+        """
+        Coordinates already geocoded by the caller skip the geocoding calls.
+        The geocodes run concurrently, then both legs come from the route
+        cache or a single distance matrix request, or from fallback (see
+        route_legs), in which case the result is marked as estimated.
+        """
+        try:
+            if origin_coordinates is None or destination_coordinates is None:
+                origin_coordinates, destination_coordinates = await asyncio.gather(
+                    self.geocode_address(origin_address),
+                    self.geocode_address(destination_address),
+                )
+
+            (
+                (
+                    (origin_to_vehicle_distance, origin_to_vehicle_duration),
+                    (origin_to_destination_distance, origin_to_destination_duration),
+                ),
+                estimated,
+            ) = await self.route_legs(
+                [
+                    ((vehicle_lat, vehicle_lng), tuple(origin_coordinates)),
+                    (tuple(origin_coordinates), tuple(destination_coordinates)),
+                ],
+                fallback=fallback,
+            )
+            origin_to_vehicle_distance_in_km = int(origin_to_vehicle_distance) // 1000
+            origin_to_vehicle_duration_in_hr = (
+                int(origin_to_vehicle_duration) // 60
+            ) // 60
             origin_to_destination_distance_in_km = (
-                int(origin_to_destination_distance["value"]) // 1000
+                int(origin_to_destination_distance) // 1000
             )
-
-            origin_to_destination_duration = origin_destination_distance_matrix["rows"][
-                0
-            ]["elements"][0]["duration"]
             origin_to_destination_duration_in_hr = (
-                int(origin_to_destination_duration["value"]) // 60
+                int(origin_to_destination_duration) // 60
             ) // 60
 
             total_distance_covered = (
@@ -160,6 +328,7 @@ class LogisticsCalculations:
                 "estimated_delivery_time": total_time_required,
                 "pickup_coordinates": origin_coordinates,
                 "drop_coordinates": destination_coordinates,
+                "estimated": estimated,
             }
 
             return results
@@ -0,0 +1,163 @@
+import asyncio
+import os
+import time
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class MapsError(Exception):
+    pass
+
+
+class MapsUnavailable(MapsError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Stops calling the maps API after repeated failures.
+
+    - Closed: calls go through; failure_threshold failures in a row open it
+    - Open: calls fail at once for reset_timeout seconds
+    - Half open: one trial call goes through; success closes the circuit,
+      failure opens it again
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_running:
+            self.trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.trial_running or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self.trial_running = False
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout_seconds": self.reset_timeout,
+        }
+
+
+class MapsClient:
+    """
+    Async client for the Google Maps web services, shared by the process.
+
+    - One pooled HTTP client with keep-alive, so requests reuse connections
+      instead of each controller opening its own
+    - Connect and read timeouts keep a slow maps call from holding a request
+      open indefinitely
+    - A circuit breaker fails calls at once while the API keeps failing
+    - MAPS_BASE_URL points it at a local fake server in tests
+    """
+
+    def __init__(self):
+        self.base_url = os.getenv("MAPS_BASE_URL", "https://maps.googleapis.com")
+        self.api_key = os.getenv("GOOGLE_MAPS_API_KEY")
+        self.timeout = float(os.getenv("MAPS_TIMEOUT_SECONDS", 5))
+        self.connect_timeout = float(os.getenv("MAPS_CONNECT_TIMEOUT_SECONDS", 2))
+        self.max_connections = int(os.getenv("MAPS_MAX_CONNECTIONS", 100))
+        # Time pricing waits for route legs before estimating them locally
+        self.latency_budget = float(os.getenv("MAPS_LATENCY_BUDGET_SECONDS", 2))
+        self.breaker = CircuitBreaker(
+            int(os.getenv("MAPS_BREAKER_FAILURES", 5)),
+            float(os.getenv("MAPS_BREAKER_RESET_SECONDS", 30)),
+        )
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def request(self, path: str, params: dict):
+        if not self.breaker.allow():
+            raise MapsUnavailable("Maps API circuit is open")
+
+        try:
+            response = await self.client.get(
+                path, params={**params, "key": self.api_key}
+            )
+            response.raise_for_status()
+            body = response.json()
+            if body.get("status") not in ("OK", "ZERO_RESULTS"):
+                raise MapsError(
+                    f"{path} returned {body.get('status')}: "
+                    f"{body.get('error_message', '')}"
+                )
+        except (httpx.HTTPError, MapsError, ValueError, asyncio.CancelledError):
+            # A call cancelled for running past the latency budget counts too
+            self.breaker.record_failure()
+            raise
+
+        self.breaker.record_success()
+        return body
+
+    async def geocode(self, address: str):
+        body = await self.request("/maps/api/geocode/json", {"address": address})
+        return body.get("results", [])
+
+    async def distance_matrix(self, origins, destinations, mode: str = "driving"):
+        """
+        origins and destinations are lists of (lat, lng).
+        """
+
+        def points(locations):
+            return "|".join(
+                f"{latitude},{longitude}" for latitude, longitude in locations
+            )
+
+        return await self.request(
+            "/maps/api/distancematrix/json",
+            {
+                "origins": points(origins),
+                "destinations": points(destinations),
+                "mode": mode,
+            },
+        )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+maps_client = MapsClient()
@@ -0,0 +1,65 @@
+"""
+Per-row cost of hydrating ORM entities versus fetching projected columns on
+the fleet snapshot and driver index refresh paths.
+
+Run from the service directory against a populated database:
+
+    python -m utils.profile_queries --rounds 5
+"""
+
+import argparse
+import asyncio
+import math
+import time
+from sqlalchemy import select
+from config.database import SessionLocal
+from models.models import Vehicle, Driver
+from utils.driver_index import DRIVER_INDEX_COLUMNS
+from utils.fleet_snapshot import SNAPSHOT_COLUMNS
+
+
+async def time_query(query, fetch, rounds):
+    best, row_count = math.inf, 0
+    for _ in range(rounds):
+        async with SessionLocal() as session:
+            start = time.perf_counter()
+            result = await session.execute(query)
+            rows = fetch(result)
+            best = min(best, time.perf_counter() - start)
+            row_count = len(rows)
+    return best, row_count
+
+
+async def profile(rounds: int):
+    cases = [
+        (
+            "vehicles",
+            select(Vehicle).filter(Vehicle.is_available == True),
+            select(*SNAPSHOT_COLUMNS).filter(Vehicle.is_available == True),
+        ),
+        (
+            "drivers",
+            select(Driver).filter(Driver.availability == True),
+            select(*DRIVER_INDEX_COLUMNS).filter(Driver.availability == True),
+        ),
+    ]
+
+    print(f"{'table':<10}{'mode':<12}{'rows':>8}{'total ms':>12}{'us/row':>10}")
+    for table, entity_query, projected_query in cases:
+        for mode, query, fetch in (
+            ("entity", entity_query, lambda result: result.scalars().all()),
+            ("projection", projected_query, lambda result: result.all()),
+        ):
+            elapsed, row_count = await time_query(query, fetch, rounds)
+            per_row = elapsed / row_count * 1e6 if row_count else 0.0
+            print(
+                f"{table:<10}{mode:<12}{row_count:>8}"
+                f"{elapsed * 1000:>12.2f}{per_row:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(profile(args.rounds))
@@ -0,0 +1,74 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class RouteLegCache:
+    """
+    Per-process cache of driving distances and durations between two points.
+
+    - Endpoints are snapped to a small grid, so repeated legs such as hub to
+      hub routes share one entry
+    - Entries expire after ROUTE_CACHE_TTL_SECONDS since durations follow
+      traffic; the least recently used entries are dropped beyond the size
+      limit
+    """
+
+    def __init__(self):
+        self.cell_size_deg = float(os.getenv("ROUTE_CACHE_CELL_DEG", 0.005))
+        self.expiry = float(os.getenv("ROUTE_CACHE_TTL_SECONDS", 60 * 60))
+        self.max_entries = int(os.getenv("ROUTE_CACHE_SIZE", 50000))
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, origin, destination, mode: str):
+        return (
+            *(math.floor(coordinate / self.cell_size_deg) for coordinate in origin),
+            *(
+                math.floor(coordinate / self.cell_size_deg)
+                for coordinate in destination
+            ),
+            mode,
+        )
+
+    def get(self, origin, destination, mode: str):
+        """
+        (distance in metres, duration in seconds) of the leg, or None.
+        """
+        key = self.key_for(origin, destination, mode)
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.entries.pop(key, None)
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, origin, destination, mode: str, leg):
+        key = self.key_for(origin, destination, mode)
+        self.entries[key] = (time.monotonic() + self.expiry, leg)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "cell_size_deg": self.cell_size_deg,
+            "ttl_seconds": self.expiry,
+        }
+
+
+route_cache = RouteLegCache()
@@ -0,0 +1,109 @@
+import math
+import os
+from dotenv import load_dotenv
+from config.cache import (
+    RedisCache,
+    SEARCH_CACHE_PREFIX,
+    SEARCH_INVALIDATION_ALL_TAG,
+    SEARCH_INVALIDATION_CELL_DEG,
+    search_invalidation_tag,
+)
+from models.schema import VehicleSearch
+
+load_dotenv()
+
+
+class SearchResultCache:
+    """
+    Short-lived Redis cache of vehicle search pages.
+
+    - Pickup and drop points are snapped to the centre of a small grid cell,
+      so nearby searches share one entry; capacity is kept exact, since the
+      search filters on it
+    - Entries are tagged with the coarse cells their search radius covers;
+      admin and driver services clear those tags when a vehicle in them changes
+    """
+
+    # Above this many cells an entry is only tagged with the catch-all tag
+    MAX_TAGS_PER_ENTRY = 400
+
+    def __init__(self, cache: RedisCache):
+        self.cache = cache
+        self.cell_size_deg = float(os.getenv("SEARCH_CACHE_CELL_DEG", 0.01))
+        self.expiry = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", 30))
+        self.hits_key = f"{SEARCH_CACHE_PREFIX}:stats:hits"
+        self.misses_key = f"{SEARCH_CACHE_PREFIX}:stats:misses"
+
+    def snap(self, coordinate):
+        cell = math.floor(coordinate / self.cell_size_deg)
+        return round((cell + 0.5) * self.cell_size_deg, 6)
+
+    def quantize(self, search_params: VehicleSearch):
+        return VehicleSearch(
+            capacity_in_kg=search_params.capacity_in_kg,
+            pickup_latitude=self.snap(search_params.pickup_latitude),
+            pickup_longitude=self.snap(search_params.pickup_longitude),
+            drop_latitude=self.snap(search_params.drop_latitude),
+            drop_longitude=self.snap(search_params.drop_longitude),
+        )
+
+    def key_for(self, search_params: VehicleSearch, cursor: str = None):
+        return ":".join(
+            [
+                SEARCH_CACHE_PREFIX,
+                f"{search_params.pickup_latitude},{search_params.pickup_longitude}",
+                f"{search_params.drop_latitude},{search_params.drop_longitude}",
+                str(search_params.capacity_in_kg),
+                cursor or "",
+            ]
+        )
+
+    def tags_for(self, min_latitude, max_latitude, min_longitude, max_longitude):
+        if min_longitude is None:
+            return [SEARCH_INVALIDATION_ALL_TAG]
+
+        rows = range(
+            math.floor(min_latitude / SEARCH_INVALIDATION_CELL_DEG),
+            math.floor(max_latitude / SEARCH_INVALIDATION_CELL_DEG) + 1,
+        )
+        cols = range(
+            math.floor(min_longitude / SEARCH_INVALIDATION_CELL_DEG),
+            math.floor(max_longitude / SEARCH_INVALIDATION_CELL_DEG) + 1,
+        )
+        if len(rows) * len(cols) > self.MAX_TAGS_PER_ENTRY:
+            return [SEARCH_INVALIDATION_ALL_TAG]
+
+        return [
+            search_invalidation_tag(
+                (row + 0.5) * SEARCH_INVALIDATION_CELL_DEG,
+                (col + 0.5) * SEARCH_INVALIDATION_CELL_DEG,
+            )
+            for row in rows
+            for col in cols
+        ]
+
+    async def get(self, key):
+        value = await self.cache.get_cache(key)
+        await self.cache.increment(
+            self.hits_key if value is not None else self.misses_key
+        )
+        return value
+
+    async def set(self, key, value, tags):
+        await self.cache.set_cache(key, value, expiry=self.expiry)
+        await self.cache.tag(key, tags, self.expiry)
+
+    async def stats(self):
+        hits = int(await self.cache.get_cache(self.hits_key) or 0)
+        misses = int(await self.cache.get_cache(self.misses_key) or 0)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "cell_size_deg": self.cell_size_deg,
+            "ttl_seconds": self.expiry,
+        }
+
+
+search_cache = SearchResultCache(RedisCache())
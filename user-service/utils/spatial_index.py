@@ -0,0 +1,128 @@
+import math
+import numpy as np
+
+
+class VehicleGridIndex:
+    """
+    Uniform lat/lon grid over the rows of the fleet snapshot.
+
+    - Every cell keeps the snapshot positions of the vehicles inside it
+    - Searches walk rings of cells around the pickup point instead of the whole fleet
+    """
+
+    KM_PER_DEGREE = 111.32
+
+    def __init__(self, cell_size_deg: float = 0.5):
+        self.cell_size_deg = cell_size_deg
+        self.n_rows = math.ceil(180 / cell_size_deg)
+        self.n_cols = math.ceil(360 / cell_size_deg)
+        self.cells = {}
+        self.cell_of_member = {}
+
+    def cell_of(self, latitude, longitude):
+        row = int((float(latitude) + 90) // self.cell_size_deg)
+        col = int((float(longitude) + 180) // self.cell_size_deg)
+        return min(max(row, 0), self.n_rows - 1), col % self.n_cols
+
+    def ring_distance(self, cell_a, cell_b):
+        row_gap = abs(cell_a[0] - cell_b[0])
+        col_gap = abs(cell_a[1] - cell_b[1])
+        return max(row_gap, min(col_gap, self.n_cols - col_gap))
+
+    def clear(self):
+        self.cells = {}
+        self.cell_of_member = {}
+
+    def upsert(self, member, latitude, longitude):
+        cell = self.cell_of(latitude, longitude)
+        if self.cell_of_member.get(member) == cell:
+            return
+
+        self.remove(member)
+        self.cell_of_member[member] = cell
+        self.cells.setdefault(cell, set()).add(member)
+
+    def remove(self, member):
+        cell = self.cell_of_member.pop(member, None)
+        if cell is None:
+            return
+
+        cell_members = self.cells.get(cell)
+        if cell_members is not None:
+            cell_members.discard(member)
+            if not cell_members:
+                del self.cells[cell]
+
+    def max_rings_for(self, latitude, max_distance_km):
+        """
+        Number of rings needed to cover the radius, using the narrower
+        longitude span of a cell at this latitude.
+        """
+        cos_latitude = max(math.cos(math.radians(float(latitude))), 0.01)
+        cell_km = self.cell_size_deg * self.KM_PER_DEGREE * cos_latitude
+        return min(math.ceil(max_distance_km / cell_km), max(self.n_rows, self.n_cols))
+
+    def iter_rings(self, center, max_rings):
+        """
+        Yield (ring, cells) around the center cell. Once a ring has more cells
+        than the grid has occupied cells, switch to grouping the occupied cells.
+        """
+        ring = 0
+        while ring <= max_rings:
+            if 8 * ring > len(self.cells):
+                remaining = {}
+                for cell in self.cells:
+                    distance = self.ring_distance(center, cell)
+                    if ring <= distance <= max_rings:
+                        remaining.setdefault(distance, []).append(cell)
+                for distance in sorted(remaining):
+                    yield distance, remaining[distance]
+                return
+
+            row, col = center
+            ring_cells = set()
+            for row_offset in range(-ring, ring + 1):
+                ring_row = row + row_offset
+                if ring_row < 0 or ring_row >= self.n_rows:
+                    continue
+                if abs(row_offset) == ring:
+                    col_offsets = range(-ring, ring + 1)
+                else:
+                    col_offsets = (-ring, ring)
+                for col_offset in col_offsets:
+                    ring_cells.add((ring_row, (col + col_offset) % self.n_cols))
+
+            yield ring, [cell for cell in ring_cells if cell in self.cells]
+            ring += 1
+
+    def candidates(self, latitude, longitude, min_count, max_distance_km, eligible):
+        """
+        Eligible members around the point, widening ring by ring until
+        min_count are found. One extra ring is scanned after that, since a
+        vehicle in the next ring can still be closer than one in a cell corner.
+
+        eligible maps an array of members to a boolean mask.
+        """
+        center = self.cell_of(latitude, longitude)
+        max_rings = self.max_rings_for(latitude, max_distance_km)
+
+        found = []
+        found_count = 0
+        stop_after_ring = None
+        for ring, ring_cells in self.iter_rings(center, max_rings):
+            if stop_after_ring is not None and ring > stop_after_ring:
+                break
+
+            members = [member for cell in ring_cells for member in self.cells[cell]]
+            if members:
+                members = np.asarray(members)
+                members = members[eligible(members)]
+                found.append(members)
+                found_count += len(members)
+
+            if stop_after_ring is None and found_count >= min_count:
+                stop_after_ring = ring + 1
+
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(found)
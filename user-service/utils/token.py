@@ -10,6 +10,10 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+ADMIN_EMAIL = os.getenv("ADMIN_EMAIL")
+# Quotes use their own key so a quote can never pass as an access token
+QUOTE_SECRET_KEY = os.getenv("QUOTE_SECRET_KEY", f"{SECRET_KEY}:quotes")
+QUOTE_TOKEN_EXPIRE_SECONDS = int(os.getenv("QUOTE_TOKEN_EXPIRE_SECONDS", 600))
 
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -34,6 +38,23 @@ def decode_access_token(token: str):
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
+def create_quote_token(quote: dict):
+    to_encode = quote.copy()
+    expire = datetime.now(timezone.utc) + timedelta(seconds=QUOTE_TOKEN_EXPIRE_SECONDS)
+    to_encode.update({"exp": expire.timestamp()})
+    return jwt.encode(to_encode, QUOTE_SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_quote_token(token: str):
+    """
+    The signed quote, or None when the token is expired or not a valid quote.
+    """
+    try:
+        return jwt.decode(token, QUOTE_SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.JWTError:
+        return None
+
+
 def verification(token: str, role: str, entity_id: str):
     try:
         decoded_data = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -71,3 +92,16 @@ def verification(token: str, role: str, entity_id: str):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
         )
+
+
+def verify_admin(token: str):
+    """
+    For operational hooks in this service that only an admin-service login may call.
+    """
+    decoded_data = decode_access_token(token)
+    if decoded_data.get("role") != "admin" or decoded_data.get("email") != ADMIN_EMAIL:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Unauthorized access",
+        )
+    return decoded_data